@@ -1,42 +1,841 @@
 import pandas as pd
 import numpy as np
 from itertools import combinations
-import statsmodels.formula.api as smf
-from statsmodels.stats.anova import anova_lm
 import matplotlib.pyplot as plt
 import seaborn as sns
 from sklearn.preprocessing import StandardScaler
-from patsy import dmatrix
 from statsmodels.stats.outliers_influence import OLSInfluence
-from scipy.stats import f
+from scipy.stats import f, norm
+from scipy.linalg import solve_triangular
+from scipy.optimize import minimize_scalar
 import warnings
 warnings.filterwarnings("ignore")
 
-from statsmodels.formula.api import mixedlm
+from statsmodels.regression.mixed_linear_model import MixedLM, MixedLMParams
 from statsmodels.tools.sm_exceptions import ConvergenceWarning
 warnings.simplefilter("ignore", ConvergenceWarning)
+import io
 import os
-import sys
-from io import StringIO
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
 
-def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, response_vars=None):
+logger = logging.getLogger(__name__)
+
+# warnings.catch_warnings() swaps process-global filters; serialize it across threads
+_WARNINGS_LOCK = threading.Lock()
+
+def build_rsm_design(df, predictors):
     """
-    Web output version based on the original MixedModelDOE_Function_FollowOriginal_20250804.py
-    Specially used to capture all console output and return it to the web interface for display
+    Build the full RSM design matrix (Intercept, linear, square, interaction) in one pass.
+    Column names follow patsy's naming (e.g. "I(Time ** 2)", "dye1:Time") so the
+    LogWorth tables keep the same Factor labels as the formula-based models.
+    """
+    base = df[predictors].to_numpy(dtype=float)
+    n, k = base.shape
+    pairs = list(combinations(range(k), 2))
+    X = np.empty((n, 1 + 2 * k + len(pairs)))
+    X[:, 0] = 1.0
+    X[:, 1:1 + k] = base
+    X[:, 1 + k:1 + 2 * k] = base ** 2
+    for j, (a, b) in enumerate(pairs):
+        X[:, 1 + 2 * k + j] = base[:, a] * base[:, b]
+    columns = (["Intercept"] + list(predictors)
+               + [f"I({t} ** 2)" for t in predictors]
+               + [f"{predictors[a]}:{predictors[b]}" for a, b in pairs])
+    return X, columns
 
-    New features:
-    1. Capture all console output
-    2. Return formatted analysis result text
-    3. Save console output to file
-    4. Keep the original analysis logic unchanged
+
+class DesignMatrixCache:
+    """
+    Design matrices keyed by term list, all sliced from one full RSM matrix.
+    The simplified model, collinearity check and mixed models share the same
+    columns, so they reuse one slice instead of rebuilding it from a formula.
+    """
+
+    def __init__(self, X_full, full_columns):
+        self.full_columns = list(full_columns)
+        self._index = {name: i for i, name in enumerate(self.full_columns)}
+        self._cache = {tuple(self.full_columns[1:]): (X_full, self.full_columns)}
+
+    def get(self, terms):
+        """Return (X, columns) for Intercept + terms, in the same column order patsy uses."""
+        key = tuple(terms)
+        if key not in self._cache:
+            missing = [t for t in terms if t not in self._index]
+            if missing:
+                raise KeyError(f"Terms not in the RSM design: {missing}")
+            columns = ["Intercept"] + list(terms)
+            X_full = self._cache[tuple(self.full_columns[1:])][0]
+            self._cache[key] = (X_full[:, [self._index[c] for c in columns]], columns)
+        return self._cache[key]
+
+    def frame(self, terms, index):
+        """Same slice as get(), wrapped in a DataFrame so model parameters keep their names."""
+        X, columns = self.get(terms)
+        return pd.DataFrame(X, columns=columns, index=index)
+
+
+def single_column_terms(columns):
+    """Term -> column slice map for designs where every term owns exactly one column."""
+    return {c: slice(i, i + 1) for i, c in enumerate(columns)}
+
+
+def fit_multi_response_ols(X, Y):
+    """
+    Solve every response column of Y against the same design X with one QR factorization.
+    Returns coefficients (p x m), the shared (X'X)^-1, residual variances and residual DF.
+    Falls back to the pseudo-inverse (as statsmodels OLS does) when X is rank deficient.
+    """
+    n, p = X.shape
+    Q, R = np.linalg.qr(X)
+    rank = np.linalg.matrix_rank(R)
+    if rank == p:
+        R_inv = solve_triangular(R, np.eye(p))
+        params = R_inv @ (Q.T @ Y)
+        xtx_inv = R_inv @ R_inv.T
+    else:
+        pinv_x = np.linalg.pinv(X)
+        params = pinv_x @ Y
+        xtx_inv = pinv_x @ pinv_x.T
+    resid = Y - X @ params
+    df_resid = n - rank
+    ssr = np.sum(resid ** 2, axis=0)
+    sigma2 = ssr / df_resid if df_resid > 0 else np.full(Y.shape[1], np.nan)
+    return {"params": params, "xtx_inv": xtx_inv, "sigma2": sigma2, "ssr": ssr, "df_resid": df_resid,
+            "resid": resid}
+
+
+def type3_contrasts(term_slices, n_columns):
+    """
+    Precompute the Type III L matrix of every term once per design.
+    Each L only selects the term's coefficient columns, so it is stored as a column index
+    array; the tests below use it to slice the coefficients and (X'X)^-1 directly.
+    """
+    columns = np.arange(n_columns)
+    return {term: columns[slc] for term, slc in term_slices.items()}
+
+
+def type3_wald_anova(fit, contrasts):
+    """
+    Type III Wald F-tests for every term and every response of a multi-response OLS fit.
+    Computed straight from the coefficient covariance sigma2 * (X'X)^-1, matching
+    anova_lm(typ=3): F = (Lb)' [L (X'X)^-1 L']^-1 (Lb) / (q * sigma2).
+    Returns a dict of (term x response) arrays: sum_sq, df, F, PR(>F) and LogWorth.
+    """
+    n_terms, n_resp = len(contrasts), fit["params"].shape[1]
+    wald = np.empty((n_terms, n_resp))
+    q = np.empty(n_terms)
+    for i, cols in enumerate(contrasts.values()):
+        Lb = fit["params"][cols]
+        middle = np.linalg.pinv(fit["xtx_inv"][np.ix_(cols, cols)])
+        wald[i] = np.einsum("im,ij,jm->m", Lb, middle, Lb)
+        q[i] = len(cols)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        F = wald / (q[:, None] * fit["sigma2"])
+    p_values = f.sf(F, q[:, None], fit["df_resid"])
+    logworth = -np.log10(np.where(p_values == 0, 1e-16, p_values))
+    return {"sum_sq": wald, "df": q, "F": F, "PR(>F)": p_values, "LogWorth": logworth}
+
+
+def fit_response_batches(X, df, response_vars):
+    """
+    OLS fits of all responses against X from shared factorizations.
+    Responses with the same missing-value pattern are solved together, so complete data
+    needs a single QR call however many responses are selected.
+    Returns a list of (row_mask, response_indices, fit).
+    """
+    Y = df[response_vars].to_numpy(dtype=float)
+    x_ok = np.isfinite(X).all(axis=1)
+    y_ok = np.isfinite(Y)
+    batches = {}
+    for j in range(Y.shape[1]):
+        mask = x_ok & y_ok[:, j]
+        batches.setdefault(mask.tobytes(), (mask, []))[1].append(j)
+    return [(mask, idx, fit_multi_response_ols(X[mask], Y[mask][:, idx])) for mask, idx in batches.values()]
+
+
+def multi_response_logworth(X, contrasts, df, response_vars, batches=None):
+    """
+    Type III LogWorth table (Factor x response) for all responses.
+    Pass batches from fit_response_batches() to reuse fits that were already computed.
+    """
+    if batches is None:
+        batches = fit_response_batches(X, df, response_vars)
+
+    logworth = np.zeros((len(contrasts), len(response_vars)))
+    for mask, idx, fit in batches:
+        anova = type3_wald_anova(fit, contrasts)
+        logworth[:, idx] = np.nan_to_num(anova["LogWorth"], nan=0.0)
+
+    table = pd.DataFrame(logworth, columns=response_vars)
+    table.insert(0, "Factor", list(contrasts))
+    return table
+
+
+# Tried in order until one converges; same first choices as MixedLM.fit's default
+REML_OPTIMIZERS = ["bfgs", "lbfgs", "cg", "powell"]
+
+
+def moment_variance_ratio(resid, group_codes, df_resid, floor=0.01):
+    """
+    Method-of-moments (one-way ANOVA) estimate of group variance / residual variance.
+    Applied to OLS residuals it gives the REML starting point for the random intercept.
+    The between-group DF excludes the DF already spent on the fixed effects (df_resid is
+    the OLS residual DF), since the predictors are constant within each Config group.
+    Floored above zero: at exactly zero the sqrt-parameterised likelihood has no gradient.
+    """
+    n = len(resid)
+    counts = np.bincount(group_codes)
+    counts = counts[counts > 0]
+    k = len(counts)
+    df_between = min(df_resid - (n - k), k - 1)
+    if df_between < 1 or n <= k:
+        return 1.0
+    _, codes = np.unique(group_codes, return_inverse=True)
+    means = np.bincount(codes, weights=resid) / counts
+    ms_within = np.sum((resid - means[codes]) ** 2) / (n - k)
+    ms_between = np.sum(counts * (means - resid.mean()) ** 2) / df_between
+    n0 = (n - np.sum(counts ** 2) / n) / (k - 1)
+    if ms_within <= 0:
+        return 1.0
+    return max((ms_between - ms_within) / n0 / ms_within, floor)
+
+
+def reml_start_values(batches, group_codes, response_vars):
+    """
+    Warm-start values per response from the simplified OLS fits:
+    (OLS coefficients, moment-based variance ratio of the residuals over groups).
+    """
+    starts = {}
+    for mask, idx, fit in batches:
+        codes = group_codes[mask]
+        for local, j in enumerate(idx):
+            ratio = moment_variance_ratio(fit["resid"][:, local], codes, fit["df_resid"])
+            starts[response_vars[j]] = (fit["params"][:, local], ratio)
+    return starts
+
+
+def fit_reml_with_fallback(model, start, log):
+    """
+    REML fit started from start = (fe_params, variance ratio), falling back through
+    REML_OPTIMIZERS. Convergence warnings are recorded in the log rather than ignored.
+    """
+    start_params = None
+    if start is not None:
+        fe_params, ratio = start
+        start_params = MixedLMParams.from_components(fe_params=np.asarray(fe_params, dtype=float),
+                                                     cov_re=np.array([[ratio]]))
+    with _WARNINGS_LOCK, warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ConvergenceWarning)
+        model_fit = model.fit(reml=True, start_params=start_params, method=REML_OPTIMIZERS)
+    messages = dict.fromkeys(str(w.message) for w in caught if issubclass(w.category, ConvergenceWarning))
+    for msg in messages:
+        log.append(f"⚠️ Convergence warning: {msg}")
+    if not model_fit.converged:
+        log.append(f"⚠️ REML did not converge with any of {REML_OPTIMIZERS}; estimates may be unreliable")
+    return model_fit
+
+
+class RandomInterceptREMLResults:
+    """
+    Result of fit_random_intercept_reml(), exposing the MixedLMResults attributes the
+    diagnostics use: fe_params, bse_fe, pvalues, cov_re, scale, fittedvalues, k_fe,
+    df_modelwc, converged, llf and random_effects.
+    """
+
+    def __init__(self, fe_params, cov_fe, gamma, scale, fittedvalues, random_effects, llf, converged):
+        names = fe_params.index
+        self.fe_params = fe_params
+        self.cov_fe = pd.DataFrame(cov_fe, index=names, columns=names)
+        self.bse_fe = pd.Series(np.sqrt(np.diag(cov_fe)), index=names)
+        self.pvalues = pd.Series(2 * norm.sf(np.abs(fe_params / self.bse_fe)), index=names)
+        self.scale = scale
+        self.cov_re = pd.DataFrame([[gamma * scale]], index=["Group"], columns=["Group"])
+        self.fittedvalues = fittedvalues
+        self.random_effects = random_effects
+        self.llf = llf
+        self.converged = converged
+        self.k_fe = len(names)
+        self.k_re = 1
+        self.df_modelwc = self.k_fe + 1
+
+
+def fit_random_intercept_reml(endog, exog, group_codes, start_ratio=None):
+    """
+    REML fit of y = X b + u[group] + e with one random intercept per group.
+
+    The covariance is block compound-symmetric, V_g = scale * (I + gamma * 11'), so
+    V_g^-1 = (I - w_g 11') / scale with w_g = gamma / (1 + n_g gamma). Everything the
+    likelihood needs reduces to per-group sums of X and y: after one O(n p^2) pass,
+    each evaluation costs O(G p^2 + p^3). b and scale are profiled out, leaving a 1-D
+    search over gamma = group variance / residual variance (started at start_ratio).
+    """
+    y = np.asarray(endog, dtype=float)
+    X = np.asarray(exog, dtype=float)
+    if not (np.isfinite(y).all() and np.isfinite(X).all()):
+        raise ValueError("random-intercept REML requires complete data (missing values found)")
+    n, p = X.shape
+    _, codes = np.unique(np.asarray(group_codes), return_inverse=True)
+    n_g = np.bincount(codes).astype(float)
+    Sx = np.column_stack([np.bincount(codes, weights=X[:, j]) for j in range(p)])
+    Sy = np.bincount(codes, weights=y)
+    XtX, Xty, yty = X.T @ X, X.T @ y, y @ y
+
+    def profile(gamma):
+        w = gamma / (1.0 + n_g * gamma)
+        A = XtX - (Sx * w[:, None]).T @ Sx
+        c = Xty - Sx.T @ (w * Sy)
+        beta = np.linalg.solve(A, c)
+        quad = yty - w @ (Sy ** 2) - c @ beta
+        return A, beta, quad
+
+    def neg2_reml(log_gamma):
+        gamma = np.exp(np.clip(log_gamma, -30.0, 30.0)) if np.isfinite(log_gamma) else 0.0
+        A, _, quad = profile(gamma)
+        sign, logdet_A = np.linalg.slogdet(A)
+        if sign <= 0 or quad <= 0:
+            return np.inf
+        return (n - p) * np.log(quad / (n - p)) + np.sum(np.log1p(n_g * gamma)) + logdet_A
+
+    t0 = np.log(start_ratio) if start_ratio and start_ratio > 0 else 0.0
+    opt = minimize_scalar(neg2_reml, bracket=(t0 - 1.0, t0 + 1.0), method="brent")
+    log_gamma, converged = opt.x, bool(opt.success)
+    # Boundary solution: the group variance may be exactly zero
+    if neg2_reml(-np.inf) <= opt.fun:
+        log_gamma, converged = -np.inf, True
+    gamma = float(np.exp(np.clip(log_gamma, -30.0, 30.0))) if np.isfinite(log_gamma) else 0.0
+
+    A, beta, quad = profile(gamma)
+    scale = quad / (n - p)
+    w = gamma / (1.0 + n_g * gamma)
+    u = w * (Sy - Sx @ beta)
+    fittedvalues = X @ beta + u[codes]
+    # Same REML log-likelihood convention as MixedLMResults.llf
+    llf = -0.5 * ((n - p) * (np.log(2 * np.pi * scale) + 1)
+                  + np.sum(np.log1p(n_g * gamma)) + np.linalg.slogdet(A)[1])
+
+    names = exog.columns if hasattr(exog, "columns") else [f"x{j}" for j in range(p)]
+    return RandomInterceptREMLResults(
+        fe_params=pd.Series(beta, index=names),
+        cov_fe=scale * np.linalg.inv(A),
+        gamma=gamma,
+        scale=scale,
+        fittedvalues=fittedvalues,
+        random_effects=u,
+        llf=llf,
+        converged=converged,
+    )
+
+
+def config_group_index(df_raw, group_keys):
+    """
+    Integer Config group index (0..G-1 in order of first appearance) for every row.
+    Built once per analysis and shared by the mixed models, LOF test and residual export.
+    """
+    return df_raw.groupby(group_keys, sort=False, dropna=False).ngroup().to_numpy()
+
+
+def config_group_labels(df_raw, group_keys, group_index):
+    """
+    Readable Config_combo label ("v1_v2_...") per row. Only one row per group is
+    formatted, so the cost is O(groups) string work instead of a row-wise join.
+    """
+    first_rows = pd.Series(np.arange(len(group_index))).groupby(group_index).first()
+    labels = df_raw[group_keys].iloc[first_rows.to_numpy()].astype(str).agg("_".join, axis=1)
+    return labels.to_numpy()[group_index]
+
+
+def jmp_lack_of_fit(responses, actual, fitted, df_modelwc, group_index):
+    """
+    JMP-style lack-of-fit test for several responses in one vectorized pass.
+    actual and fitted are (response x row) matrices; group means come from a single
+    bincount over response-offset group codes, so no per-response groupby or merge.
+    Returns one lof record per response.
+    """
+    m, n = actual.shape
+    counts = np.bincount(group_index)
+    G = len(counts)
+    flat_codes = (group_index[None, :] + G * np.arange(m)[:, None]).ravel()
+
+    def group_sums(values):
+        return np.bincount(flat_codes, weights=values.ravel(), minlength=G * m).reshape(m, G)
+
+    local_avg = group_sums(actual) / counts
+    fitted_avg = group_sums(fitted) / counts
+    ss_lack = np.sum(counts * (local_avg - fitted_avg) ** 2, axis=1)
+    ss_pure = np.sum((actual - np.take_along_axis(local_avg, np.broadcast_to(group_index, (m, n)), axis=1)) ** 2, axis=1)
+    df_pure = n - G
+
+    lof_records = []
+    for j, y in enumerate(responses):
+        df_lack = G - df_modelwc[j] - 1
+        ms_lack = ss_lack[j] / df_lack if df_lack > 0 else 0
+        ms_pure = ss_pure[j] / df_pure if df_pure > 0 else 0
+        F_lof = ms_lack / ms_pure if ms_pure > 0 else 0
+        p_lof = 1 - f.cdf(F_lof, df_lack, df_pure) if F_lof > 0 else 1.0
+        lof_records.append({
+            "Response": y,
+            "DF_LackOfFit": df_lack,
+            "SS_LackOfFit": ss_lack[j],
+            "MS_LackOfFit": ms_lack,
+            "DF_PureError": df_pure,
+            "SS_PureError": ss_pure[j],
+            "MS_PureError": ms_pure,
+            "F_Ratio": F_lof,
+            "p_Value": p_lof
+        })
+    return lof_records
+
+
+def _limit_worker_threads(blas_threads):
+    """Process-pool initializer: cap BLAS/OpenMP threads so parallel fits do not oversubscribe cores."""
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(blas_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=blas_threads)
+    except ImportError:
+        pass
+
+
+def uncoding_map(columns, predictors, X_mean, X_scale):
+    """
+    Precompute, once per design, how each coded coefficient maps back to original units:
+    divisor is X_std (linear), X_std² (square) or X_std_a·X_std_b (interaction), NaN for
+    the intercept or unknown terms; linear_mean holds X_mean for linear terms (else 0)
+    and is used to shift the intercept.
+    """
+    index = {name: i for i, name in enumerate(predictors)}
+    divisor = np.full(len(columns), np.nan)
+    linear_mean = np.zeros(len(columns))
+    for j, pname in enumerate(columns):
+        if pname == "Intercept":
+            continue
+        if pname.startswith("I("):
+            var = pname.split("(")[1].split("**")[0].strip()
+            if var in index:
+                divisor[j] = X_scale[index[var]] ** 2
+        elif ":" in pname:
+            var1, var2 = pname.split(":")
+            if var1 in index and var2 in index:
+                divisor[j] = X_scale[index[var1]] * X_scale[index[var2]]
+        elif pname.strip() in index:
+            i = index[pname.strip()]
+            divisor[j] = X_scale[i]
+            linear_mean[j] = X_mean[i]
+    return {"divisor": divisor, "linear_mean": linear_mean}
+
+
+def fit_mixed_model_response(y, endog, exog, group_codes, uncoding, start=None, solver="random_intercept"):
+    """
+    Fit the mixed model for one response and compute its diagnostics and uncoded estimates.
+    uncoding is the uncoding_map() of the exog columns.
+    start = (fe_params, variance ratio) warm-starts the REML optimizer (see reml_start_values).
+    solver="random_intercept" uses fit_random_intercept_reml() and falls back to statsmodels
+    MixedLM if the design is singular; solver="statsmodels" always uses MixedLM.
+    Self-contained so it can run in a worker process: console lines are collected in
+    result["log"] instead of printed, and the parent prints them in response order.
+    """
+    log = []
+    result = {"Response": y, "log": log}
+    try:
+        log.append(f"\n🔧 Fitting mixed model: {y}")
+        # Build Mixed Model (Config_combo as random group variable)
+        model_fit = None
+        if solver == "random_intercept":
+            try:
+                model_fit = fit_random_intercept_reml(endog, exog, group_codes,
+                                                      start[1] if start is not None else None)
+                if not model_fit.converged:
+                    log.append("⚠️ Random-intercept REML search did not converge; estimates may be unreliable")
+            except np.linalg.LinAlgError as e:
+                log.append(f"⚠️ Random-intercept solver failed ({e}); falling back to statsmodels MixedLM")
+        if model_fit is None:
+            model = MixedLM(endog, exog, groups=group_codes)
+            model_fit = fit_reml_with_fallback(model, start, log)
+
+        # Variance components (for diagnostics)
+        group_var = model_fit.cov_re.iloc[0, 0] if model_fit.cov_re.shape[0] > 0 else np.nan
+        residual_var = model_fit.scale  # == RMSE²
+
+        log.append(f"📊 Variance components - {y}:")
+        log.append(f"   Group variance (Config): {group_var:.4f}")
+        log.append(f"   Residual variance (Error): {residual_var:.4f}")
+        log.append(f"   RMSE: {np.sqrt(residual_var):.4f}")
+
+        result["var_record"] = {
+            "Response": y,
+            "Group_Var": group_var,
+            "Residual_Var": residual_var,
+            "RMSE_from_Var": np.sqrt(residual_var)
+        }
+
+        result["converged"] = bool(model_fit.converged)
+        result["fe_params"] = model_fit.fe_params
+        result["fittedvalues"] = model_fit.fittedvalues
+
+        y_true = endog
+        y_pred = model_fit.fittedvalues
+        resid = y_true - y_pred
+
+        # Approximate R²
+        ss_total = np.sum((y_true - y_true.mean()) ** 2)
+        ss_resid = np.sum((y_true - y_pred) ** 2)
+        r_squared = 1 - ss_resid / ss_total
+
+        # Adjusted R² (approximate)
+        k = model_fit.k_fe - 1
+        n = len(y_true)
+        adj_r_squared = 1 - (1 - r_squared) * (n - 1) / (n - k - 1)
+        rmse = np.sqrt(np.mean(resid ** 2))
+
+        result["diagnostics"] = {
+            "Response": y,
+            "R2_Approximate": r_squared,
+            "Adjusted_R2_Approximate": adj_r_squared,
+            "RMSE": rmse,
+            "Mean_Response": y_true.mean(),
+            "Observations": n
+        }
+
+        # Fixed-effect parameter table, straight from the estimate arrays
+        k_fe = len(model_fit.fe_params)
+        coef = model_fit.fe_params.to_numpy()
+        p_values = np.nan_to_num(np.asarray(model_fit.pvalues, dtype=float)[:k_fe], nan=1.0)
+        coef_tbl = pd.DataFrame({
+            "Response": y,
+            "Factor": list(model_fit.fe_params.index) + ["Group Var"],
+            "Coef.": np.append(coef, model_fit.cov_re.iloc[0, 0]),
+            "P>|z|": np.append(p_values, 1.0),
+        })
+        coef_tbl["LogWorth"] = -np.log10(coef_tbl["P>|z|"].replace(0, 1e-16))
+        result["coded"] = coef_tbl
+
+        # Parameter unstandardization (decode) via the precomputed term map
+        beta_uncoded = coef / uncoding["divisor"]
+        keep = np.isfinite(beta_uncoded)
+        intercept_uncoded = y_true.mean() - np.sum(np.where(keep, beta_uncoded, 0.0) * uncoding["linear_mean"])
+        uncoded_df = pd.DataFrame({
+            "Factor": ["Intercept"] + [name for name, k in zip(model_fit.fe_params.index, keep) if k],
+            "Estimate": np.append(intercept_uncoded, beta_uncoded[keep]),
+        })
+        uncoded_df["Response"] = y
+        result["uncoded"] = uncoded_df
+        result["df_modelwc"] = model_fit.df_modelwc
+
+    except Exception as e:
+        log.append(f"❌ Model fitting failed - {y}: {e}")
+    return result
+
+
+def input_label(source):
+    """Human-readable name of an analysis input for the log."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, pd.DataFrame):
+        return f"<DataFrame {source.shape[0]}x{source.shape[1]}>"
+    name = getattr(source, "name", None)
+    return f"<in-memory CSV: {name}>" if name else "<in-memory CSV>"
+
+
+def load_input_frame(source, columns=None, dtype=None):
+    """
+    Read the analysis input. source may be a CSV path, raw CSV bytes, a readable
+    buffer (BytesIO/StringIO/open file) or an already parsed DataFrame, so callers
+    holding the data in memory never have to write a temporary file.
+
+    columns projects the input onto those columns (names missing from the file are
+    skipped), so other columns are never parsed or copied; dtype maps columns to
+    the numeric dtype they are parsed as.
+    """
+    if isinstance(source, pd.DataFrame):
+        if columns is not None:
+            source = source[[c for c in source.columns if c in set(columns)]]
+        if dtype:
+            source = source.astype({c: t for c, t in dtype.items() if c in source.columns})
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda c: c in wanted
+    return pd.read_csv(source, usecols=usecols, dtype=dtype)
+
+
+def input_columns(source):
+    """Column names of an analysis input in file order, reading only the header line."""
+    if isinstance(source, pd.DataFrame):
+        return list(source.columns)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return list(pd.read_csv(source, nrows=0).columns)
+
+
+def column_scaling_stats(frame, columns):
+    """StandardScaler mean and scale of each column, as {column: (mean, scale)}."""
+    scaler = StandardScaler().fit(frame[columns])
+    return {c: (m, s) for c, m, s in zip(columns, scaler.mean_, scaler.scale_)}
+
+
+class DatasetCache:
+    """
+    Parsed dataset columns and their scaling statistics, keyed by dataset id
+    (content digest), so repeated analyses of one upload with different X/Y
+    subsets skip CSV parsing and refitting the scaler.
+
+    Columns are parsed on first use only (a later analysis that needs more
+    columns parses just the missing ones). A column is cached per requested
+    dtype, so a column used as a response (float_dtype) and later as a predictor
+    (default parsing) is returned exactly as an uncached read would give it.
+    Entries expire ttl seconds after
+    their last use; least recently used entries are evicted while the cached
+    columns exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, ttl=1800):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        for key in [k for k, e in self._entries.items() if now - e["used_at"] > self.ttl]:
+            self._remove(key)
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)["bytes"]
+
+    def _evict(self, keep):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = min((k for k in self._entries if k != keep), key=lambda k: self._entries[k]["used_at"])
+            self._remove(oldest)
+
+    def frame(self, key, source, columns, dtype=None):
+        """
+        DataFrame of the requested columns (in file order; names not in the file
+        are skipped) plus the entry's scaling-stats dict. Missing columns are
+        parsed from source, which must hold the data the key was derived from.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"order": input_columns(source), "columns": {}, "stats": {},
+                         "bytes": 0, "used_at": now}
+                self._entries[key] = entry
+            entry["used_at"] = now
+            available = set(entry["order"])
+            dtype = dtype or {}
+            missing = [c for c in columns if c in available and (c, dtype.get(c)) not in entry["columns"]]
+            if missing:
+                part = load_input_frame(source, columns=missing,
+                                        dtype={c: t for c, t in dtype.items() if c in missing})
+                for c in part.columns:
+                    entry["columns"][(c, dtype.get(c))] = part[c]
+                added = int(part.memory_usage(index=False, deep=True).sum())
+                entry["bytes"] += added
+                self._bytes += added
+                self._evict(keep=key)
+            wanted = set(columns)
+            ordered = [c for c in entry["order"] if c in wanted and (c, dtype.get(c)) in entry["columns"]]
+            return pd.DataFrame({c: entry["columns"][(c, dtype.get(c))] for c in ordered}), entry["stats"]
+
+    def scaling(self, stats, frame, columns):
+        """Scaling stats for columns, fitting (and remembering) only the ones not cached yet."""
+        with self._lock:
+            missing = [c for c in columns if c not in stats]
+            if missing:
+                stats.update(column_scaling_stats(frame, missing))
+            return {c: stats[c] for c in columns}
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+class AnalysisLog:
+    """
+    Console log of one analysis call. Calling it works like print(): the arguments are
+    joined into one entry, which is stored, sent to the module logger at DEBUG level and
+    passed to every listener as {"event": "log", "line": text}. event() sends other
+    progress events (stage_started, response_fitted, file_written, ...) to the listeners
+    only. Replaces redirecting the process-global sys.stdout.
+    """
+
+    def __init__(self, listeners=None):
+        self.lines = []
+        self.listeners = list(listeners or [])
+
+    def __call__(self, *args, sep=" "):
+        text = sep.join(str(a) for a in args)
+        self.lines.append(text)
+        logger.debug(text)
+        self.event("log", line=text)
+
+    def event(self, kind, **data):
+        if not self.listeners:
+            return
+        event = {"event": kind, **data}
+        for listener in self.listeners:
+            listener(event)
+
+    def text(self):
+        """Render the log exactly as the same print() calls would have written it."""
+        return "".join(line + "\n" for line in self.lines)
+
+
+class StageTimer:
+    """
+    Records wall-clock seconds per analysis stage into a dict. With an AnalysisLog,
+    begin() and mark() also report stage_started / stage_finished events.
+    """
+
+    def __init__(self, timings, log=None):
+        self.timings = timings
+        self.log = log
+        self._start = self._last = time.perf_counter()
+
+    def begin(self, stage):
+        if self.log is not None:
+            self.log.event("stage_started", stage=stage)
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = now - self._last
+        self._last = now
+        if self.log is not None:
+            self.log.event("stage_finished", stage=stage, seconds=round(self.timings[stage], 4))
+
+    def total(self):
+        self.timings["total"] = time.perf_counter() - self._start
+
+
+@dataclass
+class DOEAnalysisResult:
+    """
+    Structured output of run_mixed_model_doe().
+    tables holds every exported table as a DataFrame, keyed by its CSV file name
+    without extension; console_text() renders the human-readable report on demand.
+    """
+    file_path: object = None
+    output_dir: str = None
+    status: str = "success"
+    error: str = None
+    predictors: list = field(default_factory=list)
+    response_vars: list = field(default_factory=list)
+    simplified_factors: list = field(default_factory=list)
+    logworth_threshold: float = 1.3
+    condition_number: float = None
+    tables: dict = field(default_factory=dict)
+    diagnostics: list = field(default_factory=list)
+    lack_of_fit: list = field(default_factory=list)
+    variance_components: list = field(default_factory=list)
+    files: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    log: AnalysisLog = None
+
+    def console_text(self):
+        return self.log.text() if self.log is not None else ""
+
+    def key_metrics(self, threshold=None):
+        """
+        JSON-ready summary of the fit for downstream consumers (the Copilot agent):
+        per-response R², RMSE, lack-of-fit p-value and the simplified-model terms
+        with LogWorth >= threshold (default: the run's logworth_threshold, the
+        same cut-off that selected the simplified factors), plus all those terms as one
+        significant_effects list sorted by LogWorth. r_squared is the lowest
+        approximate R² over the responses. Non-finite values become None.
+        """
+        if threshold is None:
+            threshold = self.logworth_threshold
+
+        def number(value):
+            value = float(value)
+            return value if np.isfinite(value) else None
+
+        effects = self.tables.get("simplified_logworth")
+        lof = {row["Response"]: row for row in self.lack_of_fit}
+        responses = {}
+        significant_effects = []
+        for diag in self.diagnostics:
+            y = diag["Response"]
+            factors = []
+            if effects is not None and y in effects.columns:
+                rows = effects[(effects["Factor"] != "Intercept") & (effects[y] >= threshold)]
+                rows = rows.sort_values(y, ascending=False)
+                factors = [{"factor": f, "logworth": number(lw)} for f, lw in zip(rows["Factor"], rows[y])]
+            responses[y] = {
+                "r_squared": number(diag["R2_Approximate"]),
+                "adjusted_r_squared": number(diag["Adjusted_R2_Approximate"]),
+                "rmse": number(diag["RMSE"]),
+                "observations": int(diag["Observations"]),
+                "lack_of_fit_p_value": number(lof[y]["p_Value"]) if y in lof else None,
+                "significant_factors": factors,
+            }
+            significant_effects.extend({"response": y, **f} for f in factors)
+        r_squared = [m["r_squared"] for m in responses.values() if m["r_squared"] is not None]
+        return {
+            "model_found": self.status == "success" and bool(responses),
+            "logworth_analysis": effects is not None,
+            "r_squared": min(r_squared) if r_squared else None,
+            "significant_effects": sorted(significant_effects, key=lambda e: -(e["logworth"] or 0)),
+            "logworth_threshold": threshold,
+            "simplified_factors": list(self.simplified_factors),
+            "responses": responses,
+        }
+
+    def save_console_text(self):
+        """Render the console text, save it as console_output.txt in output_dir and return it."""
+        captured_output = self.console_text()
+        if self.output_dir and os.path.exists(self.output_dir):
+            console_output_path = os.path.join(self.output_dir, "console_output.txt")
+            with open(console_output_path, "w", encoding="utf-8") as f:
+                f.write(captured_output)
+        return captured_output
+
+
+def run_mixed_model_doe(file_path, output_dir, predictors=None, response_vars=None,
+                        n_jobs=1, blas_threads=1, mixed_solver="random_intercept", listeners=None,
+                        logworth_threshold=1.3, float_dtype="float64",
+                        dataset_cache=None, dataset_key=None):
+    """
+    Run the full DOE mixed-model analysis and return a DOEAnalysisResult.
+    file_path is a CSV path, CSV bytes, a readable buffer or a DataFrame (see load_input_frame).
+
+    Nothing is printed and sys.stdout is left alone: console lines go to a per-call
+    AnalysisLog, so several analyses can run concurrently in one process. Each listener
+    is called with progress event dicts as they happen: {"event": "log", "line": ...}
+    per console line, stage_started / stage_finished (stage, seconds), response_fitted
+    (response, index, total, converged) and file_written (file). Tables, diagnostics, the file list and stage
+    timings are returned as data; result.console_text() renders the classic console view.
+
+    n_jobs > 1 (or None for all cores) fits the per-response mixed models in a process
+    pool, each worker limited to blas_threads BLAS threads; results are merged in
+    response_vars order so the output is identical to the serial run.
+
+    mixed_solver selects the REML engine for the Config_combo random intercept:
+    "random_intercept" (dedicated O(n·p²) solver) or "statsmodels" (general MixedLM).
+
+    logworth_threshold is the Max_LogWorth a term needs to enter the simplified model
+    (1.3 ≈ p = 0.05).
+
+    Only the predictor and response columns are loaded. Responses are parsed as
+    float_dtype; "float32" halves the memory of the loaded data (and of float
+    predictor columns), while model fitting itself still runs in float64.
+
+    With a DatasetCache and dataset_key (the input's content digest), parsed
+    columns and predictor scaling stats are taken from / added to the cache.
     """
-    
-    # 🔧 Capture all console output
-    console_output = StringIO()
-    original_stdout = sys.stdout
-    
-    # Redirect output to StringIO
-    sys.stdout = console_output
     
     # User must explicitly select predictors (X) and response_vars (Y)
     if not predictors or not isinstance(predictors, list) or len(predictors) == 0:
@@ -45,32 +844,58 @@ def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, resp
         raise ValueError("At least one response variable (Y) must be selected. Please select Y variables in the interface!")
     group_keys = predictors.copy()  # Group keys dynamically follow X
 
+    log = AnalysisLog(listeners)
+    result = DOEAnalysisResult(file_path=input_label(file_path), output_dir=output_dir,
+                               response_vars=list(response_vars),
+                               logworth_threshold=logworth_threshold, log=log)
+    timer = StageTimer(result.timings, log)
+
     try:
         # === 1. Data Import ===
-        df_raw = pd.read_csv(file_path)
+        timer.begin("load")
+        load_columns = list(predictors) + list(response_vars)
+        load_dtype = {y: float_dtype for y in response_vars}
+        cached_stats = None
+        if dataset_cache is not None and dataset_key is not None:
+            df_raw, cached_stats = dataset_cache.frame((dataset_key, float_dtype), file_path,
+                                                       load_columns, load_dtype)
+        else:
+            df_raw = load_input_frame(file_path, columns=load_columns, dtype=load_dtype)
+        if np.dtype(float_dtype) != np.float64:
+            float_columns = [c for c in predictors if c in df_raw.columns and df_raw[c].dtype == np.float64]
+            df_raw = df_raw.astype({c: float_dtype for c in float_columns})
         # Only keep numeric predictors
         valid_predictors = [col for col in predictors if col in df_raw.columns and pd.api.types.is_numeric_dtype(df_raw[col])]
         if not valid_predictors:
             raise ValueError("No valid numeric predictors available for modeling!")
         predictors = valid_predictors
 
-        print("🚀 Starting DOE Mixed Model analysis...")
-        print(f"📊 Data file: {file_path}")
-        print(f"📈 Response variables: {response_vars}")
-        print(f"🔧 Predictors: {predictors}")
-        print(f"📏 Data shape: {df_raw.shape}")
+        log("🚀 Starting DOE Mixed Model analysis...")
+        log(f"📊 Data file: {result.file_path}")
+        log(f"📈 Response variables: {response_vars}")
+        log(f"🔧 Predictors: {predictors}")
+        log(f"📏 Data shape: {df_raw.shape}")
+        result.predictors = list(predictors)
+        timer.mark("load")
 
         # === 2. Standardization for simplified model building ===
-        scaler = StandardScaler()
+        timer.begin("standardize")
+        if cached_stats is not None:
+            scaling = dataset_cache.scaling(cached_stats, df_raw, predictors)
+        else:
+            scaling = column_scaling_stats(df_raw, predictors)
+        X_mean = np.array([scaling[c][0] for c in predictors])
+        X_scale = np.array([scaling[c][1] for c in predictors])
         df = df_raw.copy()
-        df[predictors] = scaler.fit_transform(df[predictors])
+        df[predictors] = (df_raw[predictors].to_numpy(dtype=float) - X_mean) / X_scale
 
-        print("\n✅ Data standardization completed")
-        print("📏 Statistics after standardization:")
-        print(f"   Mean: {df[predictors].mean().values}")
-        print(f"   Std: {df[predictors].std(ddof=0).values}")
-        print(f"   Original mean (X_mean): {scaler.mean_}")
-        print(f"   Original std (X_std): {scaler.scale_}")
+        log("\n✅ Data standardization completed")
+        log("📏 Statistics after standardization:")
+        log(f"   Mean: {df[predictors].mean().values}")
+        log(f"   Std: {df[predictors].std(ddof=0).values}")
+        log(f"   Original mean (X_mean): {X_mean}")
+        log(f"   Original std (X_std): {X_scale}")
+        timer.mark("standardize")
 
         # === 6. Construct original Config key (JMP compatible) ===
         # Auto compatible group_keys: use single column directly, combine multiple columns
@@ -78,11 +903,7 @@ def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, resp
         if not valid_group_keys:
             # fallback: use default
             valid_group_keys = ["dye1", "dye2", "dye3", "Time", "Temp"]
-        if len(valid_group_keys) == 1:
-            df_raw["Config_combo"] = df_raw[valid_group_keys[0]].astype(str)
-        else:
-            df_raw["Config_combo"] = df_raw[valid_group_keys].astype(str).agg("_".join, axis=1)
-        df["Config_combo"] = df_raw["Config_combo"]
+        group_index = config_group_index(df_raw, valid_group_keys)
 
         # === 3. Construct RSM terms ===
         def create_rsm_terms(terms):
@@ -92,32 +913,27 @@ def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, resp
             return linear + square + inter
 
         rsm_terms = create_rsm_terms(predictors)
-        print(f"\n🔧 Constructing RSM terms: {len(rsm_terms)} terms")
-        print(f"   Linear terms: {predictors}")
-        print(f"   Square terms: {[f'I({t}**2)' for t in predictors]}")
-        print(f"   Interaction terms: {[f'{a}:{b}' for a, b in combinations(predictors, 2)]}")
+        log(f"\n🔧 Constructing RSM terms: {len(rsm_terms)} terms")
+        log(f"   Linear terms: {predictors}")
+        log(f"   Square terms: {[f'I({t}**2)' for t in predictors]}")
+        log(f"   Interaction terms: {[f'{a}:{b}' for a, b in combinations(predictors, 2)]}")
 
         # === 4. Full model LogWorth scan ===
-        print("\n📊 Starting full model LogWorth analysis...")
-        effect_summary_all = pd.DataFrame()
-        for y in response_vars:
-            formula = f"{y} ~ " + " + ".join(rsm_terms)
-            model = smf.ols(formula, data=df).fit()
-            anova_tbl = anova_lm(model, typ=3).reset_index()
-            anova_tbl = anova_tbl.rename(columns={"index": "Factor"})
-            anova_tbl = anova_tbl[anova_tbl["Factor"] != "Residual"]
-            anova_tbl["LogWorth"] = -np.log10(anova_tbl["PR(>F)"].replace(0, 1e-16))
-            temp = anova_tbl[["Factor", "LogWorth"]].copy()
-            temp.columns = ["Factor", y]
-            effect_summary_all = pd.merge(effect_summary_all, temp, on="Factor", how="outer") if not effect_summary_all.empty else temp
-
-        effect_summary_all = effect_summary_all.fillna(0)
+        timer.begin("full_model")
+        log("\n📊 Starting full model LogWorth analysis...")
+        # Build the RSM design once and solve all responses together
+        X_full, full_columns = build_rsm_design(df, predictors)
+        design_cache = DesignMatrixCache(X_full, full_columns)
+        full_contrasts = type3_contrasts(single_column_terms(full_columns), len(full_columns))
+        effect_summary_all = multi_response_logworth(X_full, full_contrasts, df, response_vars)
         effect_summary_all["Median_LogWorth"] = effect_summary_all[response_vars].median(axis=1)
         effect_summary_all["Max_LogWorth"] = effect_summary_all[response_vars].max(axis=1)
-        effect_summary_all["Appears_Significant"] = (effect_summary_all[response_vars] > 1.3).sum(axis=1)
+        effect_summary_all["Appears_Significant"] = (effect_summary_all[response_vars] > logworth_threshold).sum(axis=1)
         effect_summary_all = effect_summary_all.sort_values("Max_LogWorth", ascending=False)
+        timer.mark("full_model")
 
         # === 5. Select simplified factors (keep hierarchy) ===
+        timer.begin("simplified_model")
         def get_simplified_factors(effect_matrix, threshold=1.3, min_significant=2):
             factors = effect_matrix[
                 (effect_matrix["Max_LogWorth"] >= threshold) | 
@@ -135,56 +951,53 @@ def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, resp
                     hierarchical_terms.add(base)
             return sorted(hierarchical_terms)
 
-        simplified_factors = get_simplified_factors(effect_summary_all)
+        simplified_factors = get_simplified_factors(effect_summary_all, threshold=logworth_threshold)
 
         # === 7. Collinearity check ===
         try:
-            x = dmatrix(" + ".join(simplified_factors), data=df, return_type="dataframe")
+            x, _ = design_cache.get(simplified_factors)
             xtx = x.T @ x
-            condition_number = np.linalg.cond(xtx.values)
-            print(f"\n📐 Collinearity check - X'X condition number: {condition_number:.2f}")
+            condition_number = np.linalg.cond(xtx)
+            log(f"\n📐 Collinearity check - X'X condition number: {condition_number:.2f}")
         except Exception as e:
-            print(f"\n❌ Design matrix construction error: {str(e)}")
+            log(f"\n❌ Design matrix construction error: {str(e)}")
             condition_number = float('inf')
 
         # === 8. Print output: Full Model + Simplified Model LogWorth ===
-        print("\n" + "="*80)
-        print("📊 Full model effect summary table (LogWorth)")
-        print("="*80)
-        print(effect_summary_all.to_string(index=False))
+        log("\n" + "="*80)
+        log("📊 Full model effect summary table (LogWorth)")
+        log("="*80)
+        log(effect_summary_all.to_string(index=False))
 
-        print(f"\n✅ Recommended simplified factors (with hierarchy): {simplified_factors}")
-        print(f"📐 Collinearity check - X'X condition number: {condition_number:.2f}")
+        log(f"\n✅ Recommended simplified factors (with hierarchy): {simplified_factors}")
+        log(f"📐 Collinearity check - X'X condition number: {condition_number:.2f}")
 
         # Build simplified_logworth_df
-        simplified_logworth_df = pd.DataFrame()
         for y in response_vars:
-            print(f"\n🔍 Building simplified model: {y}")
-            formula = f"{y} ~ " + " + ".join(simplified_factors)
-            model = smf.ols(formula=formula, data=df).fit()
-            anova_tbl = anova_lm(model, typ=3).reset_index()
-            anova_tbl = anova_tbl.rename(columns={"index": "Factor"})
-            anova_tbl = anova_tbl[anova_tbl["Factor"] != "Residual"]
-            anova_tbl["LogWorth"] = -np.log10(anova_tbl["PR(>F)"].replace(0, 1e-16))
-            temp = anova_tbl[["Factor", "LogWorth"]].copy()
-            temp.columns = ["Factor", y]
-            simplified_logworth_df = pd.merge(simplified_logworth_df, temp, on="Factor", how="outer") if not simplified_logworth_df.empty else temp
-
-        simplified_logworth_df = simplified_logworth_df.fillna(0)
+            log(f"\n🔍 Building simplified model: {y}")
+        x_simplified, simplified_columns = design_cache.get(simplified_factors)
+        simplified_contrasts = type3_contrasts(single_column_terms(simplified_columns), len(simplified_columns))
+        simplified_batches = fit_response_batches(x_simplified, df, response_vars)
+        simplified_logworth_df = multi_response_logworth(x_simplified, simplified_contrasts, df, response_vars,
+                                                         batches=simplified_batches)
         simplified_logworth_df["Median_LogWorth"] = simplified_logworth_df[response_vars].median(axis=1)
         simplified_logworth_df["Max_LogWorth"] = simplified_logworth_df[response_vars].max(axis=1)
-        simplified_logworth_df["Appears_Significant"] = (simplified_logworth_df[response_vars] > 1.3).sum(axis=1)
+        simplified_logworth_df["Appears_Significant"] = (simplified_logworth_df[response_vars] > logworth_threshold).sum(axis=1)
         simplified_logworth_df = simplified_logworth_df.sort_values("Max_LogWorth", ascending=False)
 
-        print("\n" + "="*80)
-        print("📊 Simplified model effect summary table (LogWorth)")
-        print("="*80)
-        print(simplified_logworth_df.to_string(index=False))
+        log("\n" + "="*80)
+        log("📊 Simplified model effect summary table (LogWorth)")
+        log("="*80)
+        log(simplified_logworth_df.to_string(index=False))
+        result.simplified_factors = list(simplified_factors)
+        result.condition_number = condition_number
+        timer.mark("simplified_model")
 
         # === Part 2: Mixed model fitting and diagnostics ===
-        print("\n" + "="*80)
-        print("🔧 Starting mixed effects model fitting")
-        print("="*80)
+        timer.begin("mixed_models")
+        log("\n" + "="*80)
+        log("🔧 Starting mixed effects model fitting")
+        log("="*80)
 
         models = {}
         param_coded_list = []
@@ -192,232 +1005,165 @@ def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, resp
         diagnostics_summary = []
         var_records = []
         lof_records = []
+        exog_simplified = design_cache.frame(simplified_factors, df.index)
+        # Warm-start REML from the simplified OLS solution
+        reml_starts = reml_start_values(simplified_batches, group_index, response_vars)
+        uncoding = uncoding_map(list(exog_simplified.columns), predictors, X_mean, X_scale)
 
-        for y in response_vars:
-            try:
-                print(f"\n🔧 Fitting mixed model: {y}")
-                # Build Mixed Model (Config_combo as random group variable)
-                formula = f"{y} ~ " + " + ".join(simplified_factors)
-                model = mixedlm(formula, data=df, groups=df["Config_combo"])
-                model_fit = model.fit(reml=True)
-                
-                # Variance components (for diagnostics)
-                group_var = model_fit.cov_re.iloc[0, 0] if model_fit.cov_re.shape[0] > 0 else np.nan
-                residual_var = model_fit.scale  # == RMSE²
-                
-                print(f"📊 Variance components - {y}:")
-                print(f"   Group variance (Config): {group_var:.4f}")
-                print(f"   Residual variance (Error): {residual_var:.4f}")
-                print(f"   RMSE: {np.sqrt(residual_var):.4f}")
-
-                var_records.append({
-                    "Response": y,
-                    "Group_Var": group_var,
-                    "Residual_Var": residual_var,
-                    "RMSE_from_Var": np.sqrt(residual_var)
-                })
-
-                models[y] = model_fit
+        fit_args = [
+            (y, df[y], exog_simplified, group_index, uncoding, reml_starts.get(y), mixed_solver)
+            for y in response_vars
+        ]
+        fit_results = []
 
-                y_true = df[y]
-                y_pred = model_fit.fittedvalues
-                resid = y_true - y_pred
+        def fitted(res):
+            # Results arrive in response order, so streaming the log here keeps the console deterministic
+            fit_results.append(res)
+            for line in res["log"]:
+                log(line)
+            log.event("response_fitted", response=res["Response"], index=len(fit_results),
+                      total=len(fit_args), converged=res.get("converged", False))
 
-                # Approximate R²
-                ss_total = np.sum((y_true - y_true.mean()) ** 2)
-                ss_resid = np.sum((y_true - y_pred) ** 2)
-                r_squared = 1 - ss_resid / ss_total
-
-                # Adjusted R² (approximate)
-                k = model_fit.k_fe - 1
-                n = len(y_true)
-                adj_r_squared = 1 - (1 - r_squared) * (n - 1) / (n - k - 1)
-                rmse = np.sqrt(np.mean(resid ** 2))
+        n_workers = min(n_jobs or os.cpu_count() or 1, len(fit_args))
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_limit_worker_threads,
+                                     initargs=(blas_threads,)) as pool:
+                for res in pool.map(fit_mixed_model_response, *zip(*fit_args)):
+                    fitted(res)
+        else:
+            for args in fit_args:
+                fitted(fit_mixed_model_response(*args))
 
-                diagnostics_summary.append({
-                    "Response": y,
-                    "R2_Approximate": r_squared,
-                    "Adjusted_R2_Approximate": adj_r_squared,
-                    "RMSE": rmse,
-                    "Mean_Response": y_true.mean(),
-                    "Observations": n
-                })
+        # Merge in response order so the CSVs do not depend on scheduling
+        for res in fit_results:
+            if "var_record" in res:
+                var_records.append(res["var_record"])
+            if "fe_params" in res:
+                models[res["Response"]] = res
+            if "diagnostics" in res:
+                diagnostics_summary.append(res["diagnostics"])
+            if "coded" in res:
+                param_coded_list.append(res["coded"])
+            if "uncoded" in res:
+                param_uncoded_list.append(res["uncoded"])
+        timer.mark("mixed_models")
 
-                # 解析固定效应参数表
-                coef_tbl = model_fit.summary().tables[1].copy()
-                coef_tbl.columns = ["Coef.", "Std.Err.", "z", "P>|z|", "[0.025", "0.975]"]
-                coef_tbl["P>|z|"] = pd.to_numeric(coef_tbl["P>|z|"], errors="coerce").fillna(1.0)
-                coef_tbl["Response"] = y
-                coef_tbl["Factor"] = coef_tbl.index
-                coef_tbl["LogWorth"] = -np.log10(coef_tbl["P>|z|"].replace(0, 1e-16))
-                param_coded_list.append(coef_tbl[["Response", "Factor", "Coef.", "P>|z|", "LogWorth"]])
-
-                # Parameter unstandardization (decode)
-                X_mean = scaler.mean_
-                X_scale = scaler.scale_
-                uncoded = []
-
-                for pname in coef_tbl.index:
-                    if pname == "Intercept":
-                        continue
-                    try:
-                        coef_coded = float(coef_tbl.loc[pname, "Coef."])
-                    except:
-                        continue
-
-                    if pname.startswith("I("):
-                        var = pname.split("(")[1].split("**")[0].strip()
-                        if var not in predictors: continue
-                        i = predictors.index(var)
-                        beta_uncoded = coef_coded / (X_scale[i] ** 2)
-
-                    elif ":" in pname:
-                        var1, var2 = pname.split(":")
-                        if var1 not in predictors or var2 not in predictors: continue
-                        i1, i2 = predictors.index(var1), predictors.index(var2)
-                        beta_uncoded = coef_coded / (X_scale[i1] * X_scale[i2])
-
-                    else:
-                        var = pname.strip()
-                        if var not in predictors: continue
-                        i = predictors.index(var)
-                        beta_uncoded = coef_coded / X_scale[i]
-
-                    uncoded.append((pname, beta_uncoded))
-
-                intercept_uncoded = y_true.mean()
-                for pname, beta_uncoded in uncoded:
-                    if pname.startswith("I(") or ":" in pname: continue
-                    var = pname.strip()
-                    if var not in predictors: continue
-                    i = predictors.index(var)
-                    intercept_uncoded -= beta_uncoded * X_mean[i]
-
-                uncoded.insert(0, ("Intercept", intercept_uncoded))
-                uncoded_df = pd.DataFrame(uncoded, columns=["Factor", "Estimate"])
-                uncoded_df["Response"] = y
-                param_uncoded_list.append(uncoded_df)
-
-                # JMP style LOF analysis
-                df_raw["_fitted"] = y_pred
-                group_df = df_raw.groupby("Config_combo").agg(
-                    local_avg=(y, "mean"),
-                    fitted_val=("_fitted", "mean"),
-                    count=("Config_combo", "count")
-                ).reset_index()
-
-                ss_lack = (group_df["count"] * (group_df["local_avg"] - group_df["fitted_val"])**2).sum()
-                df_lack = len(group_df) - model_fit.df_modelwc - 1
-                df_merge = df_raw.merge(group_df[["Config_combo", "local_avg"]], on="Config_combo", how="left")
-                ss_pure = ((df_merge[y] - df_merge["local_avg"])**2).sum()
-                df_pure = df_merge.shape[0] - len(group_df)
-
-                ms_lack = ss_lack / df_lack if df_lack > 0 else 0
-                ms_pure = ss_pure / df_pure if df_pure > 0 else 0
-                F_lof = ms_lack / ms_pure if ms_pure > 0 else 0
-                
-                from scipy.stats import f as f_dist
-                p_lof = 1 - f_dist.cdf(F_lof, df_lack, df_pure) if F_lof > 0 else 1.0
-
-                lof_records.append({
-                    "Response": y,
-                    "DF_LackOfFit": df_lack,
-                    "SS_LackOfFit": ss_lack,
-                    "MS_LackOfFit": ms_lack,
-                    "DF_PureError": df_pure,
-                    "SS_PureError": ss_pure,
-                    "MS_PureError": ms_pure,
-                    "F_Ratio": F_lof,
-                    "p_Value": p_lof
-                })
-
-            except Exception as e:
-                print(f"❌ Model fitting failed - {y}: {e}")
+        # JMP style LOF analysis, all fitted responses at once
+        timer.begin("lack_of_fit")
+        lof_fits = [res for res in fit_results if "df_modelwc" in res]
+        if lof_fits:
+            lof_records = jmp_lack_of_fit(
+                [res["Response"] for res in lof_fits],
+                df_raw[[res["Response"] for res in lof_fits]].to_numpy(dtype=float).T,
+                np.vstack([np.asarray(res["fittedvalues"], dtype=float) for res in lof_fits]),
+                [res["df_modelwc"] for res in lof_fits],
+                group_index,
+            )
+        result.diagnostics = diagnostics_summary
+        result.lack_of_fit = lof_records
+        result.variance_components = var_records
+        timer.mark("lack_of_fit")
 
         # === Diagnostics summary output ===
-        print("\n" + "="*80)
-        print("📋 JMP-style diagnostics summary")
-        print("="*80)
+        timer.begin("report")
+        log("\n" + "="*80)
+        log("📋 JMP-style diagnostics summary")
+        log("="*80)
 
         for diag, uncoded_df in zip(diagnostics_summary, param_uncoded_list):
             y = diag["Response"]
-            print(f"\n▶ Response variable: {y}")
-            print("-" * 60)
-            print(f"Approximate R²           : {diag['R2_Approximate']:.4f}")
-            print(f"Adjusted R² (approximate): {diag['Adjusted_R2_Approximate']:.4f}")
-            print(f"RMSE                     : {diag['RMSE']:.4f}")
-            print(f"Mean of response         : {diag['Mean_Response']:.4f}")
-            print(f"Number of observations   : {diag['Observations']}")
+            log(f"\n▶ Response variable: {y}")
+            log("-" * 60)
+            log(f"Approximate R²           : {diag['R2_Approximate']:.4f}")
+            log(f"Adjusted R² (approximate): {diag['Adjusted_R2_Approximate']:.4f}")
+            log(f"RMSE                     : {diag['RMSE']:.4f}")
+            log(f"Mean of response         : {diag['Mean_Response']:.4f}")
+            log(f"Number of observations   : {diag['Observations']}")
 
             # LOF analysis result
             lof_row = next((r for r in lof_records if r["Response"] == y), None)
             if lof_row:
-                print(f"\n🔬 JMP-style lack-of-fit test:")
-                print(f"Lack of fit     – DF={lof_row['DF_LackOfFit']}, SS={lof_row['SS_LackOfFit']:.6f}, MS={lof_row['MS_LackOfFit']:.6f}")
-                print(f"Pure error      – DF={lof_row['DF_PureError']}, SS={lof_row['SS_PureError']:.6f}, MS={lof_row['MS_PureError']:.6f}")
-                print(f"Total error     – DF={lof_row['DF_LackOfFit'] + lof_row['DF_PureError']}, SS={(lof_row['SS_LackOfFit'] + lof_row['SS_PureError']):.6f}")
-                print(f"F ratio         : {lof_row['F_Ratio']:.4f}")
-                print(f"p-value         : {lof_row['p_Value']:.5f}")
+                log(f"\n🔬 JMP-style lack-of-fit test:")
+                log(f"Lack of fit     – DF={lof_row['DF_LackOfFit']}, SS={lof_row['SS_LackOfFit']:.6f}, MS={lof_row['MS_LackOfFit']:.6f}")
+                log(f"Pure error      – DF={lof_row['DF_PureError']}, SS={lof_row['SS_PureError']:.6f}, MS={lof_row['MS_PureError']:.6f}")
+                log(f"Total error     – DF={lof_row['DF_LackOfFit'] + lof_row['DF_PureError']}, SS={(lof_row['SS_LackOfFit'] + lof_row['SS_PureError']):.6f}")
+                log(f"F ratio         : {lof_row['F_Ratio']:.4f}")
+                log(f"p-value         : {lof_row['p_Value']:.5f}")
             
             # Uncoded fixed effect table
-            print(f"\n📄 Fixed effect estimates (uncoded):")
-            print(f"{'Estimate':>12s}    {'Term'}")
+            log(f"\n📄 Fixed effect estimates (uncoded):")
+            log(f"{'Estimate':>12s}    {'Term'}")
             for idx, row in uncoded_df.iterrows():
-                print(f"{row['Estimate']:12.6f}    {row['Factor']}")
+                log(f"{row['Estimate']:12.6f}    {row['Factor']}")
+
+        timer.mark("report")
 
         # === Save result files ===
-        print("\n" + "="*80)
-        print("💾 Saving analysis results")
-        print("="*80)
+        timer.begin("export")
+        log("\n" + "="*80)
+        log("💾 Saving analysis results")
+        log("="*80)
         
         os.makedirs(output_dir, exist_ok=True)
 
+        def save_csv(frame, name, **kwargs):
+            frame.to_csv(os.path.join(output_dir, name), **kwargs)
+            log.event("file_written", file=name)
+
         # Save fixed intercepts
         fixed_intercepts = []
         for y in response_vars:
-            beta_0 = models[y].fe_params["Intercept"]
+            beta_0 = models[y]["fe_params"]["Intercept"]
             fixed_intercepts.append({"Response": y, "Fixed_Intercept": beta_0})
 
         fixed_df = pd.DataFrame(fixed_intercepts)
-        fixed_df.to_csv(os.path.join(output_dir, "fixed_intercepts.csv"), index=False)
+        save_csv(fixed_df, "fixed_intercepts.csv", index=False)
 
         # Save various results
-        effect_summary_all.to_csv(os.path.join(output_dir, "fullmodel_logworth.csv"), index=False)
-        simplified_logworth_df.to_csv(os.path.join(output_dir, "simplified_logworth.csv"), index=False)
-        pd.concat(param_coded_list).to_csv(os.path.join(output_dir, "coded_parameters.csv"), index=False)
-        pd.concat(param_uncoded_list).to_csv(os.path.join(output_dir, "uncoded_parameters.csv"), index=False)
+        save_csv(effect_summary_all, "fullmodel_logworth.csv", index=False)
+        save_csv(simplified_logworth_df, "simplified_logworth.csv", index=False)
+        coded_df = pd.concat(param_coded_list)
+        save_csv(coded_df, "coded_parameters.csv", index=False)
+        uncoded_all_df = pd.concat(param_uncoded_list)
+        save_csv(uncoded_all_df, "uncoded_parameters.csv", index=False)
         
         diagnostics_df = pd.DataFrame(diagnostics_summary)
-        diagnostics_df.to_csv(os.path.join(output_dir, "diagnostics_summary.csv"), index=False)
+        save_csv(diagnostics_df, "diagnostics_summary.csv", index=False)
         
-        pd.DataFrame(lof_records).to_csv(os.path.join(output_dir, "JMP_style_lof.csv"), index=False)
+        lof_df = pd.DataFrame(lof_records)
+        save_csv(lof_df, "JMP_style_lof.csv", index=False)
         
         # Standardization info
-        pd.DataFrame({
+        scaler_df = pd.DataFrame({
             "Variable": predictors,
-            "Mean": scaler.mean_,
-            "StdDev": scaler.scale_
-        }).to_csv(os.path.join(output_dir, "scaler.csv"), index=False)
+            "Mean": X_mean,
+            "StdDev": X_scale
+        })
+        save_csv(scaler_df, "scaler.csv", index=False)
 
         # Model formulas
         with open(os.path.join(output_dir, "model_formulas.txt"), "w") as f:
             for y in response_vars:
                 formula = f"{y} ~ " + " + ".join(simplified_factors)
                 f.write(f"{y} formula:\n{formula}\n\n")
+        log.event("file_written", file="model_formulas.txt")
+
+        # Readable Config labels are only built for the exported files
+        config_labels = config_group_labels(df_raw, valid_group_keys, group_index)
 
         # Residual data
+        residual_tables = {}
         for y in response_vars:
             try:
-                model_fit = models[y]
                 y_true = df[y]
-                y_pred = model_fit.fittedvalues
+                y_pred = models[y]["fittedvalues"]
                 resid = y_true - y_pred
 
                 rmse = np.sqrt(np.mean(resid ** 2))
                 pseudo_stud_resid = resid / rmse if rmse > 0 else resid
 
                 df_out = pd.DataFrame({
-                    "Config_combo": df["Config_combo"],
+                    "Config_combo": config_labels,
                     "Actual": y_true,
                     "Predicted": y_pred,
                     "Residual": resid,
@@ -425,62 +1171,92 @@ def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, resp
                 })
                 df_out.index.name = "ID"
 
-                out_path = os.path.join(output_dir, f"residual_data_{y}_from_MixedModel.csv")
-                df_out.to_csv(out_path)
+                save_csv(df_out, f"residual_data_{y}_from_MixedModel.csv")
+                residual_tables[f"residual_data_{y}_from_MixedModel"] = df_out
 
             except Exception as e:
-                print(f"❌ Residual output failed [{y}]: {e}")
+                log(f"❌ Residual output failed [{y}]: {e}")
 
         # Design data and other files
-        df_raw.to_csv(os.path.join(output_dir, "design_data.csv"), index=False)
+        design_df = df_raw.assign(Config_combo=config_labels)
+        save_csv(design_df, "design_data.csv", index=False)
         
         df_var = pd.DataFrame(var_records)
-        df_var.to_csv(os.path.join(output_dir, "mixed_model_variance_summary.csv"), index=False)
+        save_csv(df_var, "mixed_model_variance_summary.csv", index=False)
 
-        brief_path = os.path.join(output_dir, "InputDataBrief.csv")
         brief_df = pd.DataFrame({
             "Variable": predictors,
             "Mean (after standardization)": df[predictors].mean().values,
             "StdDev (after standardization)": df[predictors].std(ddof=0).values,
-            "Original Mean (X_mean)": scaler.mean_,
-            "Original StdDev (X_std)": scaler.scale_
+            "Original Mean (X_mean)": X_mean,
+            "Original StdDev (X_std)": X_scale
         })
-        brief_df.to_csv(brief_path, index=False)
+        save_csv(brief_df, "InputDataBrief.csv", index=False)
 
-        print(f"\n✅ All modeling results have been exported as CSV based on the mixed model, saved in: {output_dir}")
+        log(f"\n✅ All modeling results have been exported as CSV based on the mixed model, saved in: {output_dir}")
         
         # File list
         saved_files = [f for f in os.listdir(output_dir) if f.endswith(('.csv', '.txt'))]
-        print(f"📁 {len(saved_files)} result files generated:")
+        log(f"📁 {len(saved_files)} result files generated:")
         for file in sorted(saved_files):
-            print(f"   - {file}")
+            log(f"   - {file}")
+
+        result.files = sorted(saved_files)
+        result.tables = {
+            "fixed_intercepts": fixed_df,
+            "fullmodel_logworth": effect_summary_all,
+            "simplified_logworth": simplified_logworth_df,
+            "coded_parameters": coded_df,
+            "uncoded_parameters": uncoded_all_df,
+            "diagnostics_summary": diagnostics_df,
+            "JMP_style_lof": lof_df,
+            "scaler": scaler_df,
+            "design_data": design_df,
+            "mixed_model_variance_summary": df_var,
+            "InputDataBrief": brief_df,
+            **residual_tables,
+        }
+        timer.mark("export")
 
     except Exception as e:
-        print(f"❌ Error occurred during analysis: {str(e)}")
+        log(f"❌ Error occurred during analysis: {str(e)}")
         import traceback
         tb = traceback.format_exc()
-        print(f"Detailed error info:\n{tb}")
+        log(f"Detailed error info:\n{tb}")
+        result.status = "error"
+        result.error = str(e)
         # Also write exception stack to Render platform log
         try:
             with open("/tmp/last_error.log", "w", encoding="utf-8") as f:
                 f.write(tb)
         except Exception:
             pass
-    
-    finally:
-    # Restore original output and get captured text
-        sys.stdout = original_stdout
-        captured_output = console_output.getvalue()
-        console_output.close()
-        
-    # Save console output to file
-        if output_dir and os.path.exists(output_dir):
-            console_output_path = os.path.join(output_dir, "console_output.txt")
-            with open(console_output_path, "w", encoding="utf-8") as f:
-                f.write(captured_output)
-        
-    # Return console output content
-        return captured_output
+
+    timer.total()
+    return result
+
+
+def run_mixed_model_doe_with_output(file_path, output_dir, predictors=None, response_vars=None,
+                                    n_jobs=1, blas_threads=1, mixed_solver="random_intercept",
+                                    logworth_threshold=1.3, float_dtype="float64"):
+    """
+    Web output version based on the original MixedModelDOE_Function_FollowOriginal_20250804.py
+    Specially used to capture all console output and return it to the web interface for display
+
+    New features:
+    1. Capture all console output
+    2. Return formatted analysis result text
+    3. Save console output to file
+    4. Keep the original analysis logic unchanged
+
+    Thin wrapper over run_mixed_model_doe(): renders the console text of the structured
+    result, saves it as console_output.txt and returns it.
+    """
+    result = run_mixed_model_doe(file_path, output_dir, predictors, response_vars,
+                                 n_jobs=n_jobs, blas_threads=blas_threads, mixed_solver=mixed_solver,
+                                 logworth_threshold=logworth_threshold, float_dtype=float_dtype)
+    # Save console output to file and return its content
+    return result.save_console_text()
 
 # Entry point for direct script run
 if __name__ == "__main__":
@@ -1,13 +1,23 @@
 
 from fastapi import FastAPI, UploadFile, File, Body, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
 import os
+import asyncio
 import base64
-import tempfile
+import hashlib
+import io
+import json
+import mimetypes
 import pandas as pd
-from MixedModelDOE_Function_OutputToWeb_InputExtended_20250815 import run_mixed_model_doe_with_output
+from typing import Optional, List
+from email.utils import formatdate, parsedate_to_datetime
+from doe_jobs import JobManager, JobQueueFull, ResultCache, analysis_key, content_digest, read_progress
+from doe_analysis_store import AnalysisStore
+from doe_bundle import MEDIA_TYPES, UnsupportedBundleFormat, bundle_files, iter_zip, tables_bundle
+from doe_store import DatasetStore, UploadIncomplete, UploadOffsetMismatch
+from doe_encoding import (CorruptPayload, DecompressRequestMiddleware, PayloadTooLarge,
+                          UnsupportedEncoding, decode_payload)
 
 app = FastAPI(
     title="Mixed Model DOE Analysis API",
@@ -15,6 +25,66 @@ app = FastAPI(
     version="1.1.0"
 )
 
+# 混合模型并行拟合配置：每次分析的进程数（1 = 串行）及每个进程的 BLAS 线程数
+DOE_FIT_WORKERS = int(os.environ.get("DOE_FIT_WORKERS", "1"))
+DOE_BLAS_THREADS = int(os.environ.get("DOE_BLAS_THREADS", "1"))
+# 只加载所选 X/Y 列；响应列的解析精度（float64 或 float32，后者内存减半）
+DOE_FLOAT_DTYPE = os.environ.get("DOE_FLOAT_DTYPE", "float64")
+
+# 后台分析任务进程池：并发分析数量及排队上限，避免 CPU 密集计算阻塞事件循环
+DOE_JOB_WORKERS = int(os.environ.get("DOE_JOB_WORKERS", "2"))
+DOE_JOB_QUEUE = int(os.environ.get("DOE_JOB_QUEUE", "16"))
+DOE_JOB_TTL = int(os.environ.get("DOE_JOB_TTL", "3600"))
+
+# 每个分析写入独立的输出目录：DOE_OUTPUT_ROOT/<内容哈希>，避免并发分析互相覆盖
+DOE_OUTPUT_ROOT = os.environ.get("DOE_OUTPUT_ROOT", "./outputDOE")
+
+# 分析结果缓存：相同 CSV 内容 + X/Y + 阈值直接返回已有结果；按内存与磁盘占用做 LRU 淘汰（单位 MB）。
+# 磁盘预算也计入 DOE_OUTPUT_ROOT 下无缓存条目归属的目录（重启前的结果、失败任务的输出），优先删除其中最旧的
+DOE_CACHE_MEMORY_MB = int(os.environ.get("DOE_CACHE_MEMORY_MB", "64"))
+DOE_CACHE_DISK_MB = int(os.environ.get("DOE_CACHE_DISK_MB", "1024"))
+result_cache = ResultCache(max_memory=DOE_CACHE_MEMORY_MB * 2**20, max_disk=DOE_CACHE_DISK_MB * 2**20,
+                           root=DOE_OUTPUT_ROOT)
+# 数据集会话缓存：每个分析进程缓存已解析的列与标准化统计量（按内容哈希），
+# 同一数据集换一组 X/Y 再分析时无需重新解析 CSV；按内存上限（MB）与空闲时间（秒）淘汰
+DOE_DATASET_CACHE_MB = int(os.environ.get("DOE_DATASET_CACHE_MB", "256"))
+DOE_DATASET_CACHE_TTL = int(os.environ.get("DOE_DATASET_CACHE_TTL", "1800"))
+# 分析进度事件（阶段、日志行、已拟合响应、已写文件）按任务写入 DOE_PROGRESS_DIR/<job_id>.jsonl，
+# 由 /jobs/{job_id}/events 以 Server-Sent Events 推送；轮询间隔与心跳间隔（秒）
+DOE_PROGRESS_DIR = os.environ.get("DOE_PROGRESS_DIR", "./progress")
+DOE_EVENTS_POLL = 0.25
+DOE_EVENTS_KEEPALIVE = 15
+job_manager = JobManager(max_workers=DOE_JOB_WORKERS, max_pending=DOE_JOB_QUEUE, ttl=DOE_JOB_TTL,
+                         cache=result_cache, dataset_cache_bytes=DOE_DATASET_CACHE_MB * 2**20,
+                         dataset_cache_ttl=DOE_DATASET_CACHE_TTL, progress_dir=DOE_PROGRESS_DIR)
+
+# 简化模型入选阈值（Max_LogWorth），1.3 ≈ p = 0.05
+DEFAULT_LOGWORTH_THRESHOLD = 1.3
+
+# 上传文件按内容哈希存储（相同文件只存一份），哈希即 dataset_id
+DOE_DATASET_ROOT = os.environ.get("DOE_DATASET_ROOT", "./input/datasets")
+# 断点续传：单个分块上限（MB）及未完成上传的保留时间（秒）
+DOE_UPLOAD_CHUNK_MB = int(os.environ.get("DOE_UPLOAD_CHUNK_MB", "8"))
+DOE_UPLOAD_TTL = int(os.environ.get("DOE_UPLOAD_TTL", "86400"))
+dataset_store = DatasetStore(DOE_DATASET_ROOT, upload_ttl=DOE_UPLOAD_TTL)
+
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "https://function-togithub-thentowebdirectly-1zi3.onrender.com")
+
+# 列名探测只读取上传流的前 N KB（默认 64 KB，上限 1 MB）
+DOE_SNIFF_KB = int(os.environ.get("DOE_SNIFF_KB", "64"))
+DOE_SNIFF_MAX_KB = 1024
+
+# 结果下载的缓存策略：已完成任务的文件内容不再变化，按 URL 长期缓存；
+# 会变化的地址（运行中的任务、未指定 job_id 的旧接口、任务状态）只允许带 ETag 重新验证
+DOE_IMMUTABLE_CACHE_CONTROL = os.environ.get("DOE_IMMUTABLE_CACHE_CONTROL", "private, max-age=31536000, immutable")
+DOE_REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# 压缩请求体（gzip / zstd）：解压后 CSV 的大小上限（MB），防止压缩炸弹
+DOE_MAX_CSV_MB = int(os.environ.get("DOE_MAX_CSV_MB", "200"))
+
+# 支持 Content-Encoding: gzip / zstd 的请求体，边接收边解压
+app.add_middleware(DecompressRequestMiddleware, max_bytes=DOE_MAX_CSV_MB * 2**20)
+
 # 添加 CORS 中间件解决跨域问题
 app.add_middleware(
     CORSMiddleware,
@@ -32,42 +102,460 @@ def validate_column_names(col_list):
             return False, col
     return True, None
 
-@app.post("/DOE_InputExtended")
-async def doe_input_extended(request: Request):
-    data = await request.json()
+async def submit_analysis(file_path, predictors=None, response_vars=None,
+                          logworth_threshold=DEFAULT_LOGWORTH_THRESHOLD, digest=None):
+    """
+    提交分析任务：file_path 可为 CSV 路径或内存中的 CSV 字节
+    按输入内容、X/Y 与阈值计算内容哈希，输出写入该哈希对应的独立目录
+    digest 为已知的内容哈希（dataset_id），提供时不再重新读取文件计算
+    命中结果缓存时直接返回已完成的任务；返回 job_id
+    """
+    if digest is None:
+        digest = await asyncio.to_thread(content_digest, file_path)
+    key = analysis_key(file_path, digest=digest, predictors=predictors, response_vars=response_vars,
+                       logworth_threshold=logworth_threshold, float_dtype=DOE_FLOAT_DTYPE)
+    return job_manager.submit(
+        key=key,
+        file_path=file_path,
+        output_dir=os.path.join(DOE_OUTPUT_ROOT, key),
+        predictors=predictors,
+        response_vars=response_vars,
+        logworth_threshold=logworth_threshold,
+        float_dtype=DOE_FLOAT_DTYPE,
+        n_jobs=DOE_FIT_WORKERS,
+        blas_threads=DOE_BLAS_THREADS,
+        dataset_key=digest,
+    )
+
+
+async def run_analysis_in_pool(file_path, predictors=None, response_vars=None,
+                               logworth_threshold=DEFAULT_LOGWORTH_THRESHOLD, digest=None):
+    """
+    在后台进程池中运行分析并等待结果，不阻塞事件循环
+    参数错误（例如未选择 X/Y）以 ValueError 抛出，与原先直接调用时一致
+    """
+    job_id = await submit_analysis(file_path, predictors, response_vars, logworth_threshold, digest)
+    result = await job_manager.wait(job_id)
+    if result["status"] == "error" and not result["console_output"]:
+        raise ValueError(result["error"])
+    return job_id, result
+
+
+def queue_full_response(e):
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "message": str(e)}
+    )
+
+
+def job_files_payload(job_id):
+    """某个任务输出目录中的文件列表及其下载地址"""
+    files = bundle_files(job_manager.output_dir(job_id))
+    return {
+        "job_id": job_id,
+        "files": files,
+        "download_urls": [f"/jobs/{job_id}/download/{f}" for f in files],
+        "bundle_url": f"/jobs/{job_id}/bundle",
+        "total_files": len(files)
+    }
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 是否命中 etag（弱比较，支持逗号分隔的多个值与 *）"""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (t.removeprefix("W/") for t in tags)
+
+
+def is_not_modified(request, etag, last_modified=None):
+    """
+    按条件请求头判断客户端缓存是否仍然有效；If-None-Match 优先于 If-Modified-Since
+    last_modified 为 Unix 时间戳
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers):
+    """304 响应，只带缓存相关的头"""
+    return Response(status_code=304, headers=headers)
+
+
+def strong_etag(data):
+    """由字节内容（或其特征串）生成的强 ETag"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def file_signature(path):
+    """文件名、修改时间与大小组成的特征串，用于生成文件的 ETag"""
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}", stat.st_mtime
+
+
+def media_type_for(filename):
+    """按扩展名给出下载文件的 MIME 类型（文本类附带 utf-8 字符集）"""
+    media_type, _ = mimetypes.guess_type(filename)
+    if media_type is None:
+        return "application/octet-stream"
+    if media_type.startswith("text/"):
+        media_type += "; charset=utf-8"
+    return media_type
+
+
+def download_cache_control(job_id):
+    """已完成任务的文件可长期缓存；运行中任务只允许重新验证"""
+    job = job_manager.status(job_id)
+    if job is not None and job["finished_at"] is not None:
+        return DOE_IMMUTABLE_CACHE_CONTROL
+    return DOE_REVALIDATE_CACHE_CONTROL
+
+
+def sniff_csv_head(head, truncated, total_bytes=None):
+    """
+    根据 CSV 开头的一段字节推断列名、类型与行数
+    truncated 表示 head 不是完整文件（此时丢弃最后一行不完整的数据）
+    total_bytes 为完整文件大小，用于按字节比例估算总行数
+    """
+    if truncated:
+        last_newline = head.rfind(b"\n")
+        if last_newline > 0:
+            head = head[:last_newline + 1]
+    sample = pd.read_csv(io.BytesIO(head))
+    columns = [
+        {
+            "name": str(col),
+            "dtype": str(sample[col].dtype),
+            "numeric": bool(pd.api.types.is_numeric_dtype(sample[col])),
+            "non_null": int(sample[col].notna().sum()),
+            "unique_values": int(sample[col].nunique()),
+        }
+        for col in sample.columns
+    ]
+    rows_sampled = len(sample)
+    if not truncated:
+        estimated_rows = rows_sampled
+    elif total_bytes and rows_sampled:
+        header_bytes = head.find(b"\n") + 1
+        bytes_per_row = (len(head) - header_bytes) / rows_sampled
+        estimated_rows = int(round((total_bytes - header_bytes) / bytes_per_row))
+    else:
+        estimated_rows = None
+    return {
+        "columns": columns,
+        "numeric_columns": [c["name"] for c in columns if c["numeric"]],
+        "non_numeric_columns": [c["name"] for c in columns if not c["numeric"]],
+        "rows_sampled": rows_sampled,
+        "estimated_rows": estimated_rows,
+        "row_count_exact": not truncated,
+        "bytes_read": len(head),
+    }
+
+
+def check_selection(sniffed, predictors, response_vars):
+    """用探测结果校验 X/Y 选择，返回错误信息列表（空列表表示通过）"""
+    errors = []
+    known = {c["name"] for c in sniffed["columns"]}
+    non_numeric = set(sniffed["non_numeric_columns"])
+    for role, cols in (("predictor", predictors), ("response variable", response_vars)):
+        for col in cols:
+            if col not in known:
+                errors.append(f"Unknown {role} column: {col}")
+            elif col in non_numeric:
+                errors.append(f"{role.capitalize()} column {col} is not numeric")
+    overlap = sorted(set(predictors) & set(response_vars))
+    if overlap:
+        errors.append(f"Columns selected as both X and Y: {', '.join(overlap)}")
+    return errors
+
+
+def decode_csv_field(b64_text, encoding=None):
+    """base64 字段 -> CSV 字节；gzip/zstd 压缩的数据（声明 encoding 或按文件头识别）按块解压"""
+    return decode_payload(base64.b64decode(b64_text), encoding, max_bytes=DOE_MAX_CSV_MB * 2**20)
+
+
+def payload_error_response(e):
+    """压缩数据无法处理时的错误响应：不支持的编码 415，超出大小 413，其它 400"""
+    status_code = 415 if isinstance(e, UnsupportedEncoding) else 413 if isinstance(e, PayloadTooLarge) else 400
+    return JSONResponse(
+        status_code=status_code,
+        content={"status": "error", "message": f"Invalid data payload: {str(e)}"}
+    )
+
+
+def read_analysis_request(data):
+    """解析并校验 /DOE_InputExtended 与 /jobs 共用的 JSON 参数，返回 (kwargs, 错误响应)"""
     predictors = data.get("predictors", [])
     response_vars = data.get("response_vars", [])
     # 后端校验
     for col_list in [predictors, response_vars]:
         valid, invalid_col = validate_column_names(col_list)
         if not valid:
-            return JSONResponse(
+            return None, JSONResponse(
                 status_code=400,
                 content={"status": "error", "message": f"Invalid column name: {invalid_col}"}
             )
-    # 其它参数
-    file_path = data.get("file_path")
-    output_dir = data.get("output_dir", "./outputDOE")
-    # 调用分析主函数
     try:
-        console_output = run_mixed_model_doe_with_output(
-            file_path=file_path,
-            output_dir=output_dir,
-            predictors=predictors,
-            response_vars=response_vars
+        threshold = float(data.get("threshold", DEFAULT_LOGWORTH_THRESHOLD))
+    except (TypeError, ValueError):
+        return None, JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Invalid threshold: {data.get('threshold')}"}
         )
+    # 输入数据：dataset_id（/runDOE 或 /datasets 上传返回）优先，否则使用 file_path
+    # 输出目录由服务端按任务分配，不再使用客户端传入的 output_dir
+    dataset_id = data.get("dataset_id")
+    if dataset_id:
+        file_path = dataset_store.path(dataset_id)
+        if file_path is None:
+            return None, JSONResponse(
+                status_code=404,
+                content={"status": "error", "message": f"Dataset {dataset_id} not found"}
+            )
+    else:
+        file_path = data.get("file_path")
+    return {"file_path": file_path, "predictors": predictors, "response_vars": response_vars,
+            "logworth_threshold": threshold, "digest": dataset_id or None}, None
+
+
+@app.post("/DOE_InputExtended")
+async def doe_input_extended(request: Request):
+    data = await request.json()
+    kwargs, error_response = read_analysis_request(data)
+    if error_response is not None:
+        return error_response
+    # 调用分析主函数（后台进程池）
+    try:
+        job_id, result = await run_analysis_in_pool(**kwargs)
         return {
             "status": "success",
-            "input_file": file_path,
-            "output_dir": output_dir,
-            "console_output": console_output
+            "job_id": job_id,
+            "cache": job_manager.cache_state(job_id),
+            "input_file": kwargs["file_path"],
+            "dataset_id": kwargs["digest"],
+            "output_dir": result.get("output_dir"),
+            "files": result.get("files", []),
+            "files_url": f"/jobs/{job_id}/files",
+            "bundle_url": f"/jobs/{job_id}/bundle",
+            "console_output": result["console_output"]
         }
+    except JobQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"status": "error", "message": f"DOE analysis failed: {str(e)}"}
         )
 
+
+# 异步任务接口：提交后立即返回 job_id，通过 GET /jobs/{job_id} 轮询状态和结果
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request):
+    """
+    提交 DOE 分析任务（参数与 /DOE_InputExtended 相同），立即返回 job_id
+    """
+    data = await request.json()
+    kwargs, error_response = read_analysis_request(data)
+    if error_response is not None:
+        return error_response
+    try:
+        job_id = await submit_analysis(**kwargs)
+    except JobQueueFull as e:
+        return queue_full_response(e)
+    return {
+        "status": "queued",
+        "job_id": job_id,
+        "cache": job_manager.cache_state(job_id),
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events",
+        "files_url": f"/jobs/{job_id}/files",
+        "bundle_url": f"/jobs/{job_id}/bundle"
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request):
+    """
+    查询任务状态：queued / running / succeeded / failed，完成后附带分析结果
+    响应带 ETag，状态未变化时轮询请求返回 304（无响应体）
+    """
+    job = job_manager.status(job_id)
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Job {job_id} not found"}
+        )
+    body = json.dumps(job, ensure_ascii=False, default=str).encode("utf-8")
+    headers = {"ETag": strong_etag(body),
+               "Cache-Control": DOE_REVALIDATE_CACHE_CONTROL}
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified_response(headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def sse_message(event_id, event, data):
+    """格式化一条 Server-Sent Event"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def job_event_stream(job_id, request, last_event_id=0):
+    """
+    逐条推送任务的进度事件，id 为事件序号（断线重连时跳过 Last-Event-ID 之前的事件）；
+    任务结束后发送 end 事件（任务状态，不含完整结果）并关闭连接
+    """
+    path = job_manager.progress_path(job_id)
+    offset, seq, idle = 0, 0, 0.0
+    while True:
+        job = job_manager.status(job_id)
+        # 先取状态再读文件：任务结束时进度文件已完整写入
+        finished = job is None or job["finished_at"] is not None
+        events = []
+        if path:
+            events, offset = await asyncio.to_thread(read_progress, path, offset)
+        for event in events:
+            seq += 1
+            if seq > last_event_id:
+                yield sse_message(seq, event.pop("event"), event)
+        if finished:
+            end = {"job_id": job_id, "status": job["status"] if job else "expired",
+                   "cache": job["cache"] if job else None,
+                   "status_url": f"/jobs/{job_id}", "files_url": f"/jobs/{job_id}/files"}
+            if job and "error" in job:
+                end["error"] = job["error"]
+            elif job and job["status"] == "failed":
+                end["error"] = job["result"].get("error")
+            yield sse_message(max(seq, last_event_id) + 1, "end", end)
+            return
+        idle = 0.0 if events else idle + DOE_EVENTS_POLL
+        if idle >= DOE_EVENTS_KEEPALIVE:
+            idle = 0.0
+            yield ": keepalive\n\n"
+        if await request.is_disconnected():
+            return
+        await asyncio.sleep(DOE_EVENTS_POLL)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    以 Server-Sent Events（text/event-stream）实时推送分析进度：
+    stage_started / stage_finished、log（控制台行）、response_fitted、file_written，最后是 end
+    """
+    if job_manager.status(job_id) is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Job {job_id} not found"}
+        )
+    try:
+        last_event_id = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        last_event_id = 0
+    return StreamingResponse(
+        job_event_stream(job_id, request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/jobs/{job_id}/files")
+async def list_job_files(job_id: str):
+    """
+    列出指定任务的输出文件
+    """
+    if job_manager.output_dir(job_id) is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Job {job_id} not found"}
+        )
+    return job_files_payload(job_id)
+
+
+@app.get("/jobs/{job_id}/bundle")
+async def download_job_bundle(job_id: str, request: Request, format: str = "zip"):
+    """
+    一次请求下载任务的全部结果：
+    format=zip（默认）边压缩边流式返回所有文件；
+    format=parquet / arrow 把所有 CSV 表合并为一个文件（table 列标明来源表）
+    ETag 由各文件的修改时间与大小计算，内容未变时返回 304
+    """
+    output_dir = job_manager.output_dir(job_id)
+    files = bundle_files(output_dir)
+    if not files:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"No result files for job {job_id}"}
+        )
+    fmt = format.lower()
+    if fmt not in MEDIA_TYPES:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Unsupported bundle format: {fmt} (supported: zip, parquet, arrow)"}
+        )
+    signatures, mtimes = zip(*(file_signature(os.path.join(output_dir, f)) for f in files))
+    headers = {
+        "ETag": strong_etag(";".join((fmt,) + signatures)),
+        "Last-Modified": formatdate(max(mtimes), usegmt=True),
+        "Cache-Control": download_cache_control(job_id),
+    }
+    if is_not_modified(request, headers["ETag"], max(mtimes)):
+        return not_modified_response(headers)
+    if fmt == "zip":
+        headers["Content-Disposition"] = f'attachment; filename="doe_results_{job_id}.zip"'
+        return StreamingResponse(iter_zip(output_dir, files), media_type=MEDIA_TYPES["zip"], headers=headers)
+    try:
+        content = await asyncio.to_thread(tables_bundle, output_dir, fmt)
+    except UnsupportedBundleFormat as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": str(e)})
+    headers["Content-Disposition"] = f'attachment; filename="doe_tables_{job_id}.{fmt}"'
+    return Response(content=content, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@app.get("/jobs/{job_id}/download/{filename}")
+async def download_job_file(job_id: str, filename: str, request: Request):
+    """
+    下载指定任务生成的文件
+    例如：/jobs/<job_id>/download/simplified_logworth.csv
+    支持 If-None-Match / If-Modified-Since（未变化时返回 304）与 Range 分段下载；
+    已完成任务的文件带长期缓存头
+    """
+    return job_file_response(job_id, filename, request)
+
+
+def job_file_response(job_id, filename, request):
+    """任务文件的下载响应"""
+    output_dir = job_manager.output_dir(job_id)
+    file_path = os.path.join(output_dir, os.path.basename(filename)) if output_dir else None
+    if file_path is None or not os.path.isfile(file_path):
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"File {filename} not found for job {job_id}"}
+        )
+    signature, mtime = file_signature(file_path)
+    headers = {
+        "ETag": strong_etag(signature),
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": download_cache_control(job_id),
+    }
+    if is_not_modified(request, headers["ETag"], mtime):
+        return not_modified_response(headers)
+    # FileResponse 负责 Range / If-Range（206、416），并沿用这里给出的 ETag
+    return FileResponse(
+        path=file_path,
+        filename=os.path.basename(filename),
+        media_type=media_type_for(filename),
+        headers=headers
+    )
+
 # 根路径提供 HTML 界面
 @app.get("/")
 async def serve_html():
@@ -85,25 +573,215 @@ async def run_doe(file: UploadFile = File(None)):
             content={"status": "error", "message": "No file uploaded"}
         )
 
-    safe_filename = os.path.basename(file.filename)
-    input_dir = "./input"
-    os.makedirs(input_dir, exist_ok=True)
-    input_path = os.path.join(input_dir, safe_filename)
+    # 按内容哈希存储：边写边算哈希，相同文件只保留一份
+    try:
+        dataset_id, size, deduplicated = await asyncio.to_thread(dataset_store.save_fileobj, file.file)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"status": "error", "message": f"File save failed: {str(e)}"}
+        )
 
+    return {
+        "status": "success",
+        "filename": os.path.basename(file.filename),
+        "input_file": dataset_store.path_for(dataset_id),
+        "dataset_id": dataset_id,
+        "size": size,
+        "deduplicated": deduplicated
+    }
+
+
+# 新增：以原始请求体流式上传 CSV（不经过 multipart 缓存），返回 dataset_id
+@app.post("/datasets")
+async def upload_dataset(request: Request):
+    """
+    请求体即 CSV 内容；边接收边写入并计算 SHA-256，相同内容只存一份
+    返回的 dataset_id 可代替 file_path 传给 /DOE_InputExtended 与 /jobs
+    """
+    writer = dataset_store.writer()
     try:
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        async for chunk in request.stream():
+            writer.write(chunk)
+        if writer.size == 0:
+            writer.abort()
+            return JSONResponse(
+                status_code=400,
+                content={"status": "error", "message": "Empty upload"}
+            )
+        dataset_id, deduplicated = writer.commit()
     except Exception as e:
+        writer.abort()
         return JSONResponse(
             status_code=500,
             content={"status": "error", "message": f"File save failed: {str(e)}"}
         )
+    return {
+        "status": "success",
+        "dataset_id": dataset_id,
+        "size": writer.size,
+        "deduplicated": deduplicated
+    }
+
+# 新增：断点续传的分块上传（init -> 按 offset 追加分块 -> finalize），完成后存入 dataset 存储
+@app.post("/uploads")
+async def start_upload(request: Request):
+    """
+    创建上传会话，JSON 参数：filename（可选）、total_bytes（可选，提供后 finalize 会校验完整性）
+    返回 upload_id、当前 offset（0）及建议的分块大小
+    """
+    body = await request.body()
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": "Request body must be a JSON object"}
+        )
+    total_bytes = data.get("total_bytes")
+    if total_bytes is not None and (not isinstance(total_bytes, int) or total_bytes < 0):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Invalid total_bytes: {total_bytes}"}
+        )
+    if data.get("filename") is not None and not isinstance(data["filename"], str):
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Invalid filename: {data['filename']}"}
+        )
+    filename = os.path.basename(data["filename"]) if data.get("filename") else None
+    state = await asyncio.to_thread(dataset_store.start_upload, filename, total_bytes)
+    return {"status": "success", "chunk_size": DOE_UPLOAD_CHUNK_MB * 2**20, **state}
+
 
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """
+    查询上传会话的当前 offset（断线后从该位置继续上传）
+    """
+    state = dataset_store.upload_state(upload_id)
+    if state is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Upload {upload_id} not found"}
+        )
+    return {"status": "success", **state}
+
+
+@app.put("/uploads/{upload_id}")
+async def append_upload(upload_id: str, request: Request, offset: int):
+    """
+    追加一个分块：请求体为原始字节（无 base64），offset 必须等于服务端已接收的字节数
+    offset 不一致时返回 409 及服务端当前 offset
+    """
+    limit = DOE_UPLOAD_CHUNK_MB * 2**20
+    too_large = JSONResponse(
+        status_code=413,
+        content={"status": "error", "message": f"Chunk larger than {DOE_UPLOAD_CHUNK_MB} MB"}
+    )
+    # 先按 Content-Length 拒绝；再边读边计数（压缩请求体或未声明长度时），超限立即停止读取
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        return too_large
+    buffer = bytearray()
+    async for part in request.stream():
+        buffer += part
+        if len(buffer) > limit:
+            return too_large
+    chunk = bytes(buffer)
+    try:
+        new_offset = await asyncio.to_thread(dataset_store.append_upload, upload_id, offset, chunk)
+    except KeyError:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Upload {upload_id} not found"}
+        )
+    except UploadOffsetMismatch as e:
+        return JSONResponse(
+            status_code=409,
+            content={"status": "error", "message": str(e), "offset": e.offset}
+        )
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": str(e)}
+        )
+    return {"status": "success", "upload_id": upload_id, "offset": new_offset}
+
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    """
+    完成上传：文件按内容哈希存入 dataset 存储，返回 dataset_id（可直接传给 /DOE_InputExtended）
+    """
+    try:
+        dataset_id, size, deduplicated = await asyncio.to_thread(dataset_store.finalize_upload, upload_id)
+    except KeyError:
+        return JSONResponse(
+            status_code=404,
+            content={"status": "error", "message": f"Upload {upload_id} not found"}
+        )
+    except UploadIncomplete as e:
+        return JSONResponse(
+            status_code=409,
+            content={"status": "error", "message": str(e)}
+        )
     return {
         "status": "success",
-        "input_file": input_path
+        "input_file": dataset_store.path_for(dataset_id),
+        "dataset_id": dataset_id,
+        "size": size,
+        "deduplicated": deduplicated
     }
 
+# 新增：列名探测（只读取上传流的前 N KB，在上传完整文件和运行分析前校验 X/Y）
+@app.post("/sniff_csv")
+async def sniff_csv(
+    request: Request,
+    filename: Optional[str] = None,
+    total_bytes: Optional[int] = None,
+    predictors: Optional[str] = None,
+    response_vars: Optional[str] = None,
+    kb: int = DOE_SNIFF_KB
+):
+    """
+    返回列名、推断的数据类型、是否数值列以及行数估计
+    请求体为 CSV 内容（原始字节，不是 multipart 表单），其余参数在查询字符串中：
+    服务端边接收边读取，读满 kb KB 即停止，不再接收剩余请求体；
+    浏览器可只上传文件开头的切片（file.slice），并通过 total_bytes 告知完整文件大小
+    可选的 predictors / response_vars（逗号分隔）会被校验，结果在 selection_errors 中
+    """
+    limit = max(1, min(kb, DOE_SNIFF_MAX_KB)) * 1024
+    head = bytearray()
+    async for chunk in request.stream():
+        head += chunk
+        if len(head) >= limit:
+            break
+    head = bytes(head[:limit])
+    if not head:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": "No file uploaded"}
+        )
+    if total_bytes is None and "content-length" in request.headers:
+        # 上传了整个文件（未压缩）时，Content-Length 即文件大小
+        total_bytes = int(request.headers["content-length"])
+    # 未知文件大小时，读满上限说明后面可能还有数据
+    truncated = len(head) >= limit if total_bytes is None else total_bytes > len(head)
+    try:
+        sniffed = sniff_csv_head(head, truncated, total_bytes)
+    except Exception as e:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": f"Failed to parse CSV header: {str(e)}"}
+        )
+    x_cols = [c.strip() for c in (predictors or "").split(",") if c.strip()]
+    y_cols = [c.strip() for c in (response_vars or "").split(",") if c.strip()]
+    sniffed["selection_errors"] = check_selection(sniffed, x_cols, y_cols)
+    return {"status": "success", "filename": os.path.basename(filename) if filename else None, **sniffed}
+
 @app.get("/runDOE")
 async def run_doe_get():
     return {"status": "ready"}
@@ -111,55 +789,51 @@ async def run_doe_get():
 
 # 🆕 新增：下载生成的文件
 @app.get("/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request, job_id: Optional[str] = None):
     """
-    下载分析生成的文件
-    例如：/download/simplified_logworth.csv
+    下载分析生成的文件（兼容旧接口）
+    例如：/download/simplified_logworth.csv?job_id=<job_id>
+    必须提供 job_id（不再猜测“最近完成的任务”，那常常是别人的结果）；推荐改用 /jobs/{job_id}/download/{filename}
     """
-    output_dir = "./outputDOE"
-    file_path = os.path.join(output_dir, filename)
-    
-    if not os.path.exists(file_path):
+    if not job_id:
         return JSONResponse(
-            status_code=404,
-            content={"status": "error", "message": f"File {filename} not found"}
+            status_code=400,
+            content={"status": "error",
+                     "message": f"Missing job_id; use /jobs/{{job_id}}/download/{filename}"}
         )
-    
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type='application/octet-stream'
-    )
+    return job_file_response(job_id, filename, request)
 
 # 🆕 新增：列出所有可下载的文件
 @app.get("/files")
-async def list_files():
+async def list_files(job_id: Optional[str] = None):
     """
-    列出所有可下载的分析结果文件
+    列出分析结果文件（兼容旧接口）
+    必须提供 job_id；推荐改用 /jobs/{job_id}/files
     """
-    output_dir = "./outputDOE"
-    if not os.path.exists(output_dir):
+    if not job_id:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "error", "message": "Missing job_id; use /jobs/{job_id}/files"}
+        )
+    if job_manager.output_dir(job_id) is None:
         return {"files": [], "message": "No analysis results available. Run DOE analysis first."}
-    
-    files = [f for f in os.listdir(output_dir) if os.path.isfile(os.path.join(output_dir, f))]
-    return {
-        "files": files,
-        "download_urls": [f"/download/{f}" for f in files],
-        "total_files": len(files)
-    }
+    return job_files_payload(job_id)
 
 
 # 新增：支持 JSON body 传 base64 编码的 CSV 内容
 from pydantic import BaseModel
-from typing import Optional, List
 
 class DOEJsonRequest(BaseModel):
     filename: str
-    file_b64: str  # base64 encoded CSV content
+    file_b64: str  # base64 encoded CSV content（可先 gzip/zstd 压缩）
+    encoding: Optional[str] = None  # "gzip" / "zstd"；未填写时按文件头自动识别
+    predictors: Optional[List[str]] = None  # X 列
+    response_vars: Optional[List[str]] = None  # Y 列
 
 # 新增：AI Foundry 兼容的 DOE 分析请求格式
 class DoeAnalysisRequest(BaseModel):
-    data: str  # base64 encoded CSV data or URL or raw CSV
+    data: str  # base64 encoded CSV data (optionally gzip/zstd compressed) or URL or raw CSV
+    encoding: Optional[str] = None  # "gzip" / "zstd" for compressed base64 data; auto-detected if omitted
     response_column: str  # comma-separated string like "Lvalue,Avalue,Bvalue"
     predictors: Optional[str] = None  # comma-separated string, optional
     threshold: Optional[float] = 1.5
@@ -168,24 +842,27 @@ class DoeAnalysisRequest(BaseModel):
 @app.post("/runDOEjson")
 async def run_doe_json(request: DOEJsonRequest):
     try:
-        # 解码 base64 内容并保存为临时 CSV 文件
-        csv_bytes = base64.b64decode(request.file_b64)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-            tmp.write(csv_bytes)
-            tmp_path = tmp.name
-        # 设置输出目录
-        output_dir = "./outputDOE"
-        os.makedirs(output_dir, exist_ok=True)
-        # 调用 DOE 分析
-        console_output = run_mixed_model_doe_with_output(file_path=tmp_path, output_dir=output_dir)
+        # 解码 base64 内容（压缩数据按块解压），直接在内存中交给分析引擎（不写临时文件）
+        try:
+            csv_bytes = decode_csv_field(request.file_b64, request.encoding)
+        except ValueError as e:
+            return payload_error_response(e)
+        # 调用 DOE 分析（后台进程池，输出写入该任务的独立目录）
+        job_id, result = await run_analysis_in_pool(csv_bytes, request.predictors, request.response_vars)
+        console_output = result["console_output"]
         # 返回结果
         return {
             "status": "success",
-            "input_file": tmp_path,
-            "output_dir": output_dir,
-            "files": os.listdir(output_dir),
+            "job_id": job_id,
+            "cache": job_manager.cache_state(job_id),
+            "input_file": request.filename,
+            "output_dir": result.get("output_dir"),
+            "files": result.get("files", []),
+            "files_url": f"/jobs/{job_id}/files",
             "console_output": console_output  # 🆕 添加控制台输出
         }
+    except JobQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -208,54 +885,58 @@ async def doe_analysis(request: DoeAnalysisRequest):
                 status_code=400,
                 content={"status": "error", "message": "URL data input not supported yet. Please use base64 encoded data."}
             )
-        elif "," in request.data and "\n" in request.data:
+        elif not request.encoding and "," in request.data and "\n" in request.data:
             # 原始 CSV 数据
             csv_content = request.data.encode('utf-8')
         else:
-            # base64 编码数据
+            # base64 编码数据（可为 gzip/zstd 压缩后再编码）
             try:
-                csv_content = base64.b64decode(request.data)
+                csv_content = decode_csv_field(request.data, request.encoding)
+            except (UnsupportedEncoding, PayloadTooLarge, CorruptPayload) as e:
+                return payload_error_response(e)
             except Exception:
                 return JSONResponse(
                     status_code=400,
                     content={"status": "error", "message": "Invalid base64 data format"}
                 )
         
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".csv", mode='wb') as tmp:
-            tmp.write(csv_content)
-            tmp_path = tmp.name
-        
-        # 设置输出目录
-        output_dir = "./outputDOE"
-        os.makedirs(output_dir, exist_ok=True)
+        # 解析 Y 与 X：X 必须显式指定
+        response_vars = [c.strip() for c in request.response_column.split(",") if c.strip()]
+        predictors = [c.strip() for c in (request.predictors or "").split(",") if c.strip()]
+        if not predictors:
+            return JSONResponse(
+                status_code=400,
+                content={"status": "error", "message": "Missing predictors (comma-separated X columns)"}
+            )
         
-        # 调用 DOE 分析
-        console_output = run_mixed_model_doe_with_output(file_path=tmp_path, output_dir=output_dir)
+        # 调用 DOE 分析（CSV 字节直接在内存中解析；输出写入该任务的独立目录；相同数据与参数命中缓存）
+        # 简化模型使用默认的 LogWorth 阈值；request.threshold 仅作为 requested_threshold 原样返回
+        job_id, result = await run_analysis_in_pool(csv_content, predictors, response_vars,
+                                                     DEFAULT_LOGWORTH_THRESHOLD)
+        console_output = result["console_output"]
         
         # 构建响应格式，兼容 AI Foundry
         response = {
             "status": "success",
             "summary": {
-                "response_variables": request.response_column.split(","),
-                "threshold": request.threshold,
+                "response_variables": response_vars,
+                "predictors": result.get("predictors") or predictors,
+                "threshold": DEFAULT_LOGWORTH_THRESHOLD,
+                "requested_threshold": request.threshold,
                 "force_full_dataset": request.force_full_dataset,
                 "analysis_completed": True
             },
-            "input_file": tmp_path,
-            "output_dir": output_dir,
-            "files": os.listdir(output_dir),
+            "job_id": job_id,
+            "cache": job_manager.cache_state(job_id),
+            "output_dir": result.get("output_dir"),
+            "files": result.get("files", []),
+            "files_url": f"/jobs/{job_id}/files",
             "console_output": console_output  # 🆕 添加控制台输出
         }
-        
-        # 清理临时文件
-        try:
-            os.unlink(tmp_path)
-        except:
-            pass
-            
         return response
         
+    except JobQueueFull as e:
+        return queue_full_response(e)
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -265,8 +946,15 @@ async def doe_analysis(request: DoeAnalysisRequest):
 
 # ===== Copilot Agent 集成 API =====
 
-# 简单的内存存储（生产环境建议使用数据库）
-analysis_storage = {}
+# 分析结果存储：SQLite 持久化（多个 worker 进程共享，控制台文本压缩存储，超过保留天数自动删除），
+# 前置按内存上限（MB）LRU 淘汰、按秒数过期的进程内缓存
+DOE_ANALYSIS_DB = os.environ.get("DOE_ANALYSIS_DB", "./analysis_store.sqlite3")
+DOE_ANALYSIS_MEMORY_MB = int(os.environ.get("DOE_ANALYSIS_MEMORY_MB", "32"))
+DOE_ANALYSIS_MEMORY_TTL = int(os.environ.get("DOE_ANALYSIS_MEMORY_TTL", "600"))
+DOE_ANALYSIS_RETENTION_DAYS = float(os.environ.get("DOE_ANALYSIS_RETENTION_DAYS", "30"))
+analysis_storage = AnalysisStore(DOE_ANALYSIS_DB, max_memory=DOE_ANALYSIS_MEMORY_MB * 2**20,
+                                 memory_ttl=DOE_ANALYSIS_MEMORY_TTL,
+                                 retention=DOE_ANALYSIS_RETENTION_DAYS * 24 * 3600)
 
 @app.post("/store_analysis")
 async def store_analysis(request: dict):
@@ -285,20 +973,21 @@ async def store_analysis(request: dict):
                 content={"status": "error", "message": "Missing analysis_id or console_output"}
             )
         
-        # 获取当前可用文件列表
-        output_dir = "./outputDOE"
-        available_files = []
-        if os.path.exists(output_dir):
-            available_files = os.listdir(output_dir)
+        # 获取该分析任务的文件列表与结构化指标（job_id 可放在请求或 metadata 中）；
+        # 未指定 job_id 时不猜测任务（本进程最近完成的任务可能属于其他用户），指标从 console_output 提取
+        job_id = request.get("job_id") or (metadata.get("job_id") if isinstance(metadata, dict) else None)
+        available_files = job_files_payload(job_id)["files"] if job_id else []
         
-        # 存储分析数据
-        analysis_storage[analysis_id] = {
+        # 存储分析数据（关键指标在存储时一次算好，读取时直接返回）
+        await asyncio.to_thread(analysis_storage.put, analysis_id, {
             "console_output": console_output,
             "timestamp": timestamp,
             "metadata": metadata,
+            "job_id": job_id,
+            "metrics": job_metrics(job_id) or extract_key_metrics(console_output),
             "files": available_files,
-            "download_base_url": "https://function-togithub-thentowebdirectly-1zi3.onrender.com/download/"
-        }
+            "download_base_url": f"{PUBLIC_BASE_URL}/jobs/{job_id}/download/" if job_id else None
+        })
         
         return {
             "status": "success", 
@@ -325,21 +1014,20 @@ async def get_analysis_for_copilot(analysis_id: str = None):
             content={"status": "error", "message": "Missing analysis_id parameter"}
         )
     
-    if analysis_id not in analysis_storage:
+    analysis_data = await asyncio.to_thread(analysis_storage.get, analysis_id)
+    if analysis_data is None:
         return JSONResponse(
             status_code=404,
             content={"status": "error", "message": f"Analysis {analysis_id} not found"}
         )
     
     try:
-        analysis_data = analysis_storage[analysis_id]
-        
         # 格式化为适合 AI 分析的结构
         formatted_response = {
             "status": "success",
             "analysis_id": analysis_id,
             "analysis_text": analysis_data["console_output"],
-            "summary": extract_key_metrics(analysis_data["console_output"]),
+            "summary": analysis_data.get("metrics") or extract_key_metrics(analysis_data["console_output"]),
             "timestamp": analysis_data["timestamp"],
             "files_available": analysis_data["files"],
             "download_base_url": analysis_data["download_base_url"],
@@ -355,9 +1043,21 @@ async def get_analysis_for_copilot(analysis_id: str = None):
         )
 
 
+def job_metrics(job_id):
+    """
+    任务结果中由分析引擎直接生成的关键指标（各响应的 R²、RMSE、LOF p 值、显著因子及其 LogWorth）；
+    任务未知、已过期或尚未完成时返回 None
+    """
+    job = job_manager.status(job_id) if job_id else None
+    if job is None or job.get("result") is None:
+        return None
+    return job["result"].get("metrics")
+
+
 def extract_key_metrics(console_output: str) -> dict:
     """
     从控制台输出中提取关键指标
+    仅在无法取得任务的结构化指标时使用（例如任务已过期，或早于指标索引存储的记录）
     """
     try:
         summary = {
@@ -7,15 +7,21 @@ CSV to Base64 Converter Tool
 2. 自动扫描路径 - 程序自动查找当前目录的 CSV 文件
 3. API 自动处理 - 通过 HTTP 请求传递 Base64 数据，无需本地路径
 
+🗜️ 压缩模式：先 gzip / zstd 压缩再 Base64 编码（CSV 通常可压缩 5-10 倍），
+   请求 JSON 中会带上 "encoding" 字段，API 端自动解压；zstd 需要安装 zstandard 包
+
 Author: Zhang Lei
 Created: August 2025
 """
 
 import base64
+import gzip
 import os
 import json
 import glob
 
+SUPPORTED_COMPRESSIONS = ("gzip", "zstd")
+
 def list_csv_files_in_directory(directory="."):
     """
     列出指定目录中的所有 CSV 文件
@@ -30,12 +36,32 @@ def list_csv_files_in_directory(directory="."):
     csv_files = glob.glob(csv_pattern)
     return csv_files
 
-def csv_to_base64(csv_file_path):
+def compress_bytes(content, compression):
+    """
+    按指定格式压缩字节数据
+    
+    Args:
+        content (bytes): 原始数据
+        compression (str): "gzip" 或 "zstd"
+        
+    Returns:
+        bytes: 压缩后的数据
+    """
+    if compression == "gzip":
+        # mtime=0：相同文件得到相同的压缩结果，便于服务端缓存命中
+        return gzip.compress(content, compresslevel=9, mtime=0)
+    if compression == "zstd":
+        import zstandard  # 可选依赖：pip install zstandard
+        return zstandard.ZstdCompressor(level=19).compress(content)
+    raise ValueError(f"不支持的压缩格式：{compression}（可选：gzip, zstd）")
+
+def csv_to_base64(csv_file_path, compression=None):
     """
-    将 CSV 文件转换为 Base64 编码
+    将 CSV 文件转换为 Base64 编码（可先压缩再编码）
     
     Args:
         csv_file_path (str): CSV 文件的完整路径
+        compression (str): 压缩格式 "gzip" / "zstd"，None 表示不压缩
         
     Returns:
         str: Base64 编码的字符串
@@ -44,8 +70,13 @@ def csv_to_base64(csv_file_path):
         print(f"📁 正在读取文件：{csv_file_path}")
         with open(csv_file_path, 'rb') as file:
             csv_content = file.read()
-            base64_encoded = base64.b64encode(csv_content).decode('utf-8')
             print(f"✅ 文件读取成功，大小：{len(csv_content)} 字节")
+            if compression:
+                compressed = compress_bytes(csv_content, compression)
+                print(f"🗜️ {compression} 压缩完成，大小：{len(compressed)} 字节"
+                      f"（压缩比 {len(csv_content) / max(len(compressed), 1):.1f}x）")
+                csv_content = compressed
+            base64_encoded = base64.b64encode(csv_content).decode('utf-8')
             print(f"🔄 Base64 编码成功，长度：{len(base64_encoded)} 字符")
             return base64_encoded
     except FileNotFoundError:
@@ -54,13 +85,16 @@ def csv_to_base64(csv_file_path):
     except PermissionError:
         print(f"❌ 错误：没有权限读取文件 - {csv_file_path}")
         return None
+    except ImportError:
+        print("❌ 错误：zstd 压缩需要安装 zstandard 包（pip install zstandard），或改用 gzip")
+        return None
     except Exception as e:
         print(f"❌ 错误：无法读取文件 {csv_file_path}")
         print(f"📝 详细错误：{str(e)}")
         return None
 
 def create_ai_foundry_json(csv_file_path, response_columns="Lvalue,Avalue,Bvalue", 
-                          predictors=None, threshold=1.5):
+                          predictors=None, threshold=1.5, compression=None):
     """
     创建 AI Foundry 兼容的 JSON 请求格式
     
@@ -69,11 +103,12 @@ def create_ai_foundry_json(csv_file_path, response_columns="Lvalue,Avalue,Bvalue
         response_columns (str): 响应变量（逗号分隔）
         predictors (str): 预测变量（逗号分隔，可选）
         threshold (float): LogWorth 阈值
+        compression (str): 压缩格式 "gzip" / "zstd"，None 表示不压缩
         
     Returns:
         dict: AI Foundry 请求格式的字典
     """
-    base64_data = csv_to_base64(csv_file_path)
+    base64_data = csv_to_base64(csv_file_path, compression)
     if base64_data is None:
         return None
         
@@ -86,6 +121,9 @@ def create_ai_foundry_json(csv_file_path, response_columns="Lvalue,Avalue,Bvalue
     
     if predictors:
         request_json["predictors"] = predictors
+    
+    if compression:
+        request_json["encoding"] = compression
         
     return request_json
 
@@ -179,10 +217,18 @@ def main():
         threshold = 1.5
         print("⚠️ 阈值输入无效，使用默认值 1.5")
     
+    # 获取压缩方式（可选）
+    compression = input("是否压缩后再编码（none / gzip / zstd，默认：none）：").strip().lower()
+    if compression in ("", "none"):
+        compression = None
+    elif compression not in SUPPORTED_COMPRESSIONS:
+        compression = None
+        print("⚠️ 压缩方式无效，不压缩")
+    
     print("\n🔄 正在转换...")
     
     # 方式1：输出 Base64 字符串
-    base64_result = csv_to_base64(csv_file)
+    base64_result = csv_to_base64(csv_file, compression)
     if base64_result:
         print(f"\n✅ Base64 编码成功！")
         
@@ -193,7 +239,7 @@ def main():
         print(f"💾 Base64 字符串已保存到：{base64_file}")
     
     # 方式2：创建 AI Foundry JSON 格式
-    json_result = create_ai_foundry_json(csv_file, response_cols, predictors, threshold)
+    json_result = create_ai_foundry_json(csv_file, response_cols, predictors, threshold, compression)
     if json_result:
         json_file = csv_file.replace('.csv', '_ai_foundry_request.json')
         save_json_file(json_result, json_file)
@@ -204,6 +250,8 @@ def main():
         print(f"   threshold: {json_result['threshold']}")
         if 'predictors' in json_result:
             print(f"   predictors: {json_result['predictors']}")
+        if 'encoding' in json_result:
+            print(f"   encoding: {json_result['encoding']}")
     
     print(f"\n🎯 使用说明：")
     print(f"1. 将 Base64 字符串复制到 AI Agent 聊天窗口")
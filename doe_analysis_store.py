@@ -0,0 +1,155 @@
+"""
+Bounded, persistent storage for analyses shared with the Copilot agent
+
+/store_analysis used to put every record into a module-level dict: memory grew
+without limit, a restart lost everything, and with several uvicorn workers a
+record stored by one worker could not be read by another. AnalysisStore keeps
+records in an SQLite database that all worker processes share, with a small
+per-process LRU tier in front of it for the records read most often.
+
+The memory tier is bounded by size and holds entries for at most memory_ttl
+seconds, which also bounds how long a worker can serve a record that another
+worker has since overwritten. The console text, by far the largest field, is
+zlib-compressed in the database; records older than retention seconds are
+deleted.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    analysis_id TEXT PRIMARY KEY,
+    console BLOB NOT NULL,
+    record TEXT NOT NULL,
+    stored_at REAL NOT NULL
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS analyses_stored_at ON analyses (stored_at)"
+
+# Purge expired rows at most this often (seconds)
+_PURGE_INTERVAL = 60
+
+
+def record_size(record):
+    """Approximate in-memory footprint of a record, in bytes."""
+    return len(json.dumps(record, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class AnalysisStore:
+    """
+    analysis_id -> record dict (console_output plus JSON-serialisable fields).
+    put() writes through to SQLite; get() tries the memory tier first.
+    """
+
+    def __init__(self, db_path="./analysis_store.sqlite3", max_memory=32 * 2**20,
+                 memory_ttl=600, retention=30 * 24 * 3600, compress_level=6):
+        self.db_path = db_path
+        self.max_memory = max_memory
+        self.memory_ttl = memory_ttl
+        self.retention = retention
+        self.compress_level = compress_level
+        self._memory = OrderedDict()  # analysis_id -> (record, size, loaded_at)
+        self._memory_bytes = 0
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            conn.execute(_INDEX)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation: safe across threads and processes
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # --- memory tier ---
+
+    def _remember(self, analysis_id, record):
+        size = record_size(record)
+        with self._lock:
+            self._forget(analysis_id)
+            if size > self.max_memory:
+                return
+            self._memory[analysis_id] = (record, size, time.time())
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory:
+                _, (_, evicted_size, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _forget(self, analysis_id):
+        entry = self._memory.pop(analysis_id, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    def _recall(self, analysis_id):
+        with self._lock:
+            entry = self._memory.get(analysis_id)
+            if entry is None:
+                return None
+            if time.time() - entry[2] > self.memory_ttl:
+                self._forget(analysis_id)
+                return None
+            self._memory.move_to_end(analysis_id)
+            return entry[0]
+
+    # --- SQLite tier ---
+
+    def _purge_expired(self, conn):
+        now = time.time()
+        if self.retention is None or now - self._last_purge < _PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        conn.execute("DELETE FROM analyses WHERE stored_at < ?", (now - self.retention,))
+
+    def put(self, analysis_id, record):
+        """Store (or replace) a record; it must contain console_output."""
+        fields = {k: v for k, v in record.items() if k != "console_output"}
+        console = zlib.compress(record["console_output"].encode("utf-8"), self.compress_level)
+        with self._connect() as conn:
+            self._purge_expired(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (analysis_id, console, record, stored_at) VALUES (?, ?, ?, ?)",
+                (analysis_id, console, json.dumps(fields, ensure_ascii=False, default=str), time.time()),
+            )
+        self._remember(analysis_id, dict(record))
+
+    def get(self, analysis_id):
+        """The stored record, or None if unknown or expired."""
+        record = self._recall(analysis_id)
+        if record is not None:
+            return record
+        with self._connect() as conn:
+            row = conn.execute("SELECT console, record, stored_at FROM analyses WHERE analysis_id = ?",
+                               (analysis_id,)).fetchone()
+        if row is None:
+            return None
+        console, fields, stored_at = row
+        if self.retention is not None and time.time() - stored_at > self.retention:
+            return None
+        record = json.loads(fields)
+        record["console_output"] = zlib.decompress(console).decode("utf-8")
+        self._remember(analysis_id, record)
+        return record
+
+    def stats(self):
+        with self._connect() as conn:
+            count, stored_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(console) + LENGTH(record)), 0) FROM analyses"
+            ).fetchone()
+        with self._lock:
+            return {"memory_entries": len(self._memory), "memory_bytes": self._memory_bytes,
+                    "max_memory": self.max_memory, "stored_entries": count, "stored_bytes": stored_bytes}
@@ -0,0 +1,138 @@
+"""
+Single-download bundles of an analysis' result files
+
+A finished analysis leaves a dozen or more CSV/TXT files in its output
+directory, and fetching them one by one costs a request each. iter_zip()
+streams all of them as one zip archive, deflating each file as it is read, so
+nothing is staged on disk and the first bytes go out before the last file is
+compressed. tables_bundle() instead packs every CSV table into a single
+Parquet or Arrow file for clients that want the data rather than the files.
+
+Parquet/Arrow need the optional pyarrow package; zip uses the standard library.
+"""
+
+import io
+import json
+import os
+import zipfile
+
+import pandas as pd
+
+CHUNK_SIZE = 1 << 16
+
+TABLE_FORMATS = ("parquet", "arrow")
+
+MEDIA_TYPES = {
+    "zip": "application/zip",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Column of the tables bundle naming the CSV (without extension) each row came from
+TABLE_COLUMN = "table"
+
+
+class UnsupportedBundleFormat(ValueError):
+    """The requested bundle format is unknown, or its library is not installed."""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable stream that collects what ZipFile writes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def bundle_files(directory):
+    """Sorted names of the regular files in directory (empty if it does not exist)."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    return sorted(f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)))
+
+
+def iter_zip(directory, names=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield a deflated zip archive of the named files in directory (all files by
+    default) chunk by chunk. Entries keep the files' modification times, so the
+    same directory always produces the same archive.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name in (bundle_files(directory) if names is None else names):
+            path = os.path.join(directory, name)
+            info = zipfile.ZipInfo.from_file(path, name)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, archive.open(info, "w") as dst:
+                for chunk in iter(lambda: src.read(chunk_size), b""):
+                    dst.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def read_tables(directory):
+    """Every CSV in directory as a DataFrame, keyed by file name without extension."""
+    return {name[:-len(".csv")]: pd.read_csv(os.path.join(directory, name))
+            for name in bundle_files(directory) if name.endswith(".csv")}
+
+
+def stack_tables(tables):
+    """
+    One DataFrame holding all tables: a leading "table" column names the source
+    table and the other columns are the union of the tables' columns. Returns
+    (frame, layout) where layout maps each table to its own column list, so
+    frame[frame.table == name][layout[name]] restores it.
+    """
+    layout = {name: [str(c) for c in frame.columns] for name, frame in tables.items()}
+    frames = [frame.rename(columns=str).assign(**{TABLE_COLUMN: name})
+              for name, frame in tables.items()]
+    stacked = pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
+    columns = [TABLE_COLUMN] + [c for c in stacked.columns if c != TABLE_COLUMN]
+    stacked = stacked.reindex(columns=columns)
+    # Columns that mix numbers and text across tables are stored as text
+    for col in stacked.columns:
+        if stacked[col].dtype == object:
+            stacked[col] = stacked[col].map(lambda v: v if pd.isna(v) else str(v))
+    return stacked, layout
+
+
+def tables_bundle(directory, fmt="parquet"):
+    """
+    All CSV tables of an output directory in one Parquet or Arrow IPC file (bytes).
+    The per-table column layout is stored as JSON in the schema metadata under
+    b"doe_tables". Raises UnsupportedBundleFormat.
+    """
+    if fmt not in TABLE_FORMATS:
+        raise UnsupportedBundleFormat(f"Unsupported bundle format: {fmt} (supported: zip, parquet, arrow)")
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UnsupportedBundleFormat(f"{fmt} bundles require the pyarrow package")
+    stacked, layout = stack_tables(read_tables(directory))
+    table = pa.Table.from_pandas(stacked, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), b"doe_tables": json.dumps(layout).encode()}
+    table = table.replace_schema_metadata(metadata)
+    out = io.BytesIO()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, out, compression="zstd")
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, out, compression="zstd")
+    return out.getvalue()
@@ -0,0 +1,206 @@
+"""
+Compressed request bodies for the DOE API
+
+CSV compresses 5-10x, so clients may send it gzip- or zstd-compressed, either
+declared per field ("encoding": "gzip" next to a base64 payload) or for the
+whole HTTP body via Content-Encoding. StreamDecoder inflates incrementally and
+stops at max_bytes of output, so a small compressed body cannot expand without
+bound; DecompressRequestMiddleware applies it to the ASGI receive stream.
+
+zstd needs the optional zstandard package; gzip uses the standard library.
+"""
+
+import json
+import zlib
+
+SUPPORTED_ENCODINGS = ("gzip", "zstd")
+
+# Magic numbers, used when a payload arrives compressed without a declared encoding
+_MAGIC = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+
+_OUTPUT_STEP = 1 << 20
+
+# zstd's decompressobj has no output limit, so it is fed in small input slices.
+# A zstd block holds at most 128 KB and needs at least 4 bytes of input, so one
+# slice yields at most (256 / 4 + 1) * 128 KB ≈ 8 MB before the size check runs.
+_ZSTD_INPUT_STEP = 256
+# Largest zstd window accepted; the decoder allocates the window a frame declares
+_ZSTD_MAX_WINDOW = 1 << 25
+
+
+class UnsupportedEncoding(ValueError):
+    """The declared encoding is unknown, or its codec is not installed."""
+
+
+class PayloadTooLarge(ValueError):
+    """Decompressed output exceeded the configured limit."""
+
+
+class CorruptPayload(ValueError):
+    """The compressed data is malformed or truncated."""
+
+
+def detect_encoding(data):
+    """"gzip" or "zstd" if data starts with that format's magic number, else None."""
+    head = bytes(data[:4])
+    for magic, encoding in _MAGIC.items():
+        if head.startswith(magic):
+            return encoding
+    return None
+
+
+def normalize_encoding(encoding):
+    """Lower-cased encoding name; None for no compression. Raises UnsupportedEncoding."""
+    if encoding is None:
+        return None
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity", "none"):
+        return None
+    if encoding in ("x-gzip", "gz"):
+        encoding = "gzip"
+    if encoding in ("zstandard", "zst"):
+        encoding = "zstd"
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise UnsupportedEncoding(f"Unsupported encoding: {encoding} (supported: gzip, zstd)")
+    return encoding
+
+
+class StreamDecoder:
+    """
+    Incremental decompressor: feed() compressed chunks as they arrive and get
+    the decompressed bytes so far; finish() flushes and checks the stream ended.
+    """
+
+    def __init__(self, encoding, max_bytes=None):
+        self.encoding = normalize_encoding(encoding)
+        self.max_bytes = max_bytes
+        self.size = 0
+        if self.encoding == "gzip":
+            self._obj = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        elif self.encoding == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise UnsupportedEncoding("zstd support requires the zstandard package")
+            self._obj = zstandard.ZstdDecompressor(max_window_size=_ZSTD_MAX_WINDOW).decompressobj()
+        else:
+            self._obj = None
+
+    def _count(self, out):
+        self.size += len(out)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise PayloadTooLarge(f"Decompressed payload exceeds {self.max_bytes} bytes")
+        return out
+
+    def feed(self, chunk):
+        try:
+            return self._feed(chunk)
+        except (PayloadTooLarge, CorruptPayload):
+            raise
+        except Exception as e:  # zlib.error, zstandard.ZstdError
+            raise CorruptPayload(f"Invalid {self.encoding} data: {e}") from e
+
+    def _feed(self, chunk):
+        if self._obj is None:
+            return self._count(bytes(chunk))
+        if self.encoding == "zstd":
+            view = memoryview(chunk)
+            return b"".join(self._count(self._obj.decompress(view[i:i + _ZSTD_INPUT_STEP]))
+                            for i in range(0, len(view), _ZSTD_INPUT_STEP))
+        # zlib: bound each step's output so the size limit is enforced as we go
+        parts = []
+        data = chunk
+        while data:
+            parts.append(self._count(self._obj.decompress(data, _OUTPUT_STEP)))
+            data = self._obj.unconsumed_tail
+        return b"".join(parts)
+
+    def finish(self):
+        if self._obj is None:
+            return b""
+        out = self._count(self._obj.flush()) if self.encoding == "gzip" else b""
+        if not getattr(self._obj, "eof", True):
+            raise CorruptPayload(f"Invalid {self.encoding} data: truncated stream")
+        return out
+
+
+def decode_payload(data, encoding=None, max_bytes=None, chunk_size=_OUTPUT_STEP):
+    """
+    Decompress a complete payload (e.g. a base64-decoded field) in chunks. With
+    no declared encoding the format is recognised from its magic number, and
+    plain data is returned unchanged.
+    """
+    encoding = normalize_encoding(encoding) or detect_encoding(data)
+    if encoding is None:
+        return data
+    decoder = StreamDecoder(encoding, max_bytes)
+    view = memoryview(data)
+    parts = [decoder.feed(view[i:i + chunk_size]) for i in range(0, len(view), chunk_size)]
+    parts.append(decoder.finish())
+    return b"".join(parts)
+
+
+class DecompressRequestMiddleware:
+    """
+    ASGI middleware: requests with Content-Encoding gzip/zstd are inflated as
+    their body streams in, and reach the endpoints as plain bodies.
+    Unsupported encodings get 415, corrupt streams 400 and oversized ones 413.
+    """
+
+    def __init__(self, app, max_bytes=None):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        try:
+            encoding = normalize_encoding(headers.get(b"content-encoding", b"").decode("latin-1"))
+            decoder = StreamDecoder(encoding, self.max_bytes) if encoding else None
+        except UnsupportedEncoding as e:
+            return await _send_error(send, 415, str(e))
+        if decoder is None:
+            return await self.app(scope, receive, send)
+
+        scope = dict(scope)
+        scope["headers"] = [(k, v) for k, v in scope["headers"]
+                            if k not in (b"content-encoding", b"content-length")]
+        failure = {}
+        started = {"response": False}
+
+        async def decoded_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                try:
+                    body = decoder.feed(message.get("body", b""))
+                    if not message.get("more_body", False):
+                        body += decoder.finish()
+                except (PayloadTooLarge, CorruptPayload) as e:
+                    failure.update(status=413 if isinstance(e, PayloadTooLarge) else 400, message=str(e))
+                    raise
+                message = {**message, "body": body}
+            return message
+
+        async def guarded_send(message):
+            # Whatever the app answers to a body we could not decode is replaced below
+            if failure and not started["response"]:
+                return
+            started["response"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, decoded_receive, guarded_send)
+        except Exception:
+            if not failure or started["response"]:
+                raise
+        if failure and not started["response"]:
+            await _send_error(send, failure["status"], failure["message"])
+
+
+async def _send_error(send, status, message):
+    body = json.dumps({"status": "error", "message": message}).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,513 @@
+"""
+Background job subsystem for the DOE API
+
+The DOE analysis is CPU-bound. Running it inline in an `async def` handler blocks
+the event loop, so even health checks stall while one analysis runs. JobManager
+hands analyses to a bounded process pool and keeps a small in-memory job table
+that the /jobs endpoints (and the synchronous endpoints, via wait()) read from.
+
+Finished analyses are remembered in a ResultCache keyed by their content address,
+so resubmitting the same CSV with the same settings is answered without a rerun.
+Each worker process also keeps a DatasetCache of parsed columns and scaling stats,
+so a new X/Y selection on an already analysed dataset skips CSV parsing.
+
+While a job runs, its worker appends the engine's progress events (stages, log
+lines, fitted responses, written files) as JSON lines to a per-job progress
+file, which the /jobs/{id}/events stream tails.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import pandas as pd
+
+from MixedModelDOE_Function_OutputToWeb_InputExtended_20250815 import DatasetCache, run_mixed_model_doe
+
+
+class JobQueueFull(Exception):
+    """Raised when the number of unfinished jobs reached the configured limit."""
+
+
+def content_digest(source):
+    """
+    SHA-256 hex digest of an analysis input's data. source is a CSV path, CSV
+    bytes, a BytesIO buffer or a DataFrame, as accepted by run_mixed_model_doe.
+    For files and bytes this equals the dataset id the upload store assigns.
+    Returns None if the input cannot be read.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif isinstance(source, io.BytesIO):
+        digest.update(source.getbuffer())
+    elif isinstance(source, pd.DataFrame):
+        digest.update(json.dumps(list(map(str, source.columns))).encode())
+        digest.update(pd.util.hash_pandas_object(source, index=False).to_numpy().tobytes())
+    else:
+        try:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        except (OSError, TypeError):
+            return None
+    return digest.hexdigest()
+
+
+def analysis_key(source, digest=None, **params):
+    """
+    Content address of an analysis: SHA-256 over the input's content digest and
+    the JSON-encoded parameters. Identical submissions map to the same output
+    directory. Pass digest when it is already known (e.g. a dataset id) to skip
+    rehashing the input. An unreadable input gets a one-off key, so its
+    (failing) run is never shared.
+    """
+    digest = digest or content_digest(source) or f"unreadable:{source}:{uuid.uuid4().hex}"
+    payload = digest + json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+# Per-process dataset cache and job start queue, set up by the pool initializer in each worker
+_worker_dataset_cache = None
+_worker_started = None
+
+
+def _init_worker(dataset_cache_bytes, dataset_cache_ttl, started=None):
+    global _worker_dataset_cache, _worker_started
+    if dataset_cache_bytes > 0:
+        _worker_dataset_cache = DatasetCache(max_bytes=dataset_cache_bytes, ttl=dataset_cache_ttl)
+    _worker_started = started
+
+
+class ProgressWriter:
+    """AnalysisLog listener that appends each event as one JSON line to a file."""
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, event):
+        self._file.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_progress(path, offset=0):
+    """
+    Progress events appended to path after byte offset; returns (events, new_offset).
+    Only complete lines are consumed, so a line the worker is still writing is
+    picked up by the next call. A missing file yields no events.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return [], offset
+    end = data.rfind(b"\n") + 1
+    events = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return events, offset + end
+
+
+def run_analysis_job(dataset_key=None, progress_path=None, job_id=None, **analysis_kwargs):
+    """
+    Worker-process entry point: run one analysis and return a picklable summary.
+    Argument errors (e.g. no X/Y selected) are reported as a failed result rather
+    than raised, so the job table always gets a final state.
+    dataset_key (the input's content digest) enables this worker's dataset cache;
+    progress_path receives the analysis' progress events as JSON lines.
+    job_id and the start time are reported to the parent when the worker picks the job up.
+    """
+    if job_id is not None and _worker_started is not None:
+        _worker_started.put((job_id, time.time()))
+    if dataset_key is not None and _worker_dataset_cache is not None:
+        analysis_kwargs.update(dataset_cache=_worker_dataset_cache, dataset_key=dataset_key)
+    progress = ProgressWriter(progress_path) if progress_path else None
+    try:
+        if progress is not None:
+            analysis_kwargs["listeners"] = [progress]
+        result = run_mixed_model_doe(**analysis_kwargs)
+    except ValueError as e:
+        if progress is not None:
+            progress({"event": "log", "line": f"❌ {e}"})
+        return {"status": "error", "error": str(e), "console_output": ""}
+    finally:
+        if progress is not None:
+            progress.close()
+
+    console_output = result.save_console_text()
+    output_dir = result.output_dir
+    files = sorted(os.listdir(output_dir)) if output_dir and os.path.isdir(output_dir) else []
+    return {
+        "status": result.status,
+        "error": result.error,
+        "console_output": console_output,
+        "output_dir": output_dir,
+        "files": files,
+        "predictors": result.predictors,
+        "response_vars": result.response_vars,
+        "simplified_factors": result.simplified_factors,
+        "diagnostics": result.diagnostics,
+        "lack_of_fit": result.lack_of_fit,
+        "metrics": result.key_metrics(),
+        "timings": result.timings,
+    }
+
+
+def directory_size(path):
+    """Total size in bytes of the regular files below path (0 if it does not exist)."""
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResultCache:
+    """
+    LRU cache of successful analysis results, keyed by analysis_key.
+
+    Each entry is the picklable summary returned by run_analysis_job; its output
+    files stay in the entry's content-addressed output_dir. Two budgets are
+    enforced: the pickled size of the cached summaries (max_memory bytes) and the
+    size of their output directories on disk (max_disk bytes). Least recently used
+    entries are evicted, and their directories deleted, until both fit.
+
+    Output directories that no entry owns also count against max_disk: with a
+    root, the directories already below it are picked up at startup (results of
+    an earlier process), and track() adds those of failed jobs. These are
+    deleted first, oldest first, once they have not been modified for
+    orphan_grace seconds. claim() releases a directory a new job is about to
+    write into, so it is never deleted underneath that job.
+    """
+
+    def __init__(self, max_memory=64 * 2**20, max_disk=1024 * 2**20, root=None, orphan_grace=600):
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.orphan_grace = orphan_grace
+        self._entries = OrderedDict()
+        self._orphans = {}  # unowned output directory -> size on disk
+        self._memory = 0
+        self._disk = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        if root and os.path.isdir(root):
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if os.path.isdir(path):
+                    self._orphans[os.path.normpath(path)] = size = directory_size(path)
+                    self._disk += size
+            with self._lock:
+                self._evict()
+
+    def get(self, key):
+        """Cached result for key (marking it most recently used), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not os.path.isdir(entry["output_dir"]):
+                # Output files were removed behind our back; the entry is no longer servable
+                self._drop(key, remove_files=False)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry["result"]
+
+    def put(self, key, result):
+        """Remember a successful result, then evict down to the budgets."""
+        if result.get("status") != "success" or not result.get("output_dir"):
+            return
+        memory = len(pickle.dumps(result))
+        disk = directory_size(result["output_dir"])
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, remove_files=False)
+            self._release(result["output_dir"])
+            self._entries[key] = {"result": result, "output_dir": result["output_dir"],
+                                  "memory": memory, "disk": disk}
+            self._memory += memory
+            self._disk += disk
+            self._evict(keep=key)
+
+    def track(self, output_dir):
+        """Count an output directory no entry owns (e.g. of a failed job) against max_disk."""
+        if not output_dir or not os.path.isdir(output_dir):
+            return
+        size = directory_size(output_dir)
+        with self._lock:
+            if any(e["output_dir"] == output_dir for e in self._entries.values()):
+                return
+            self._release(output_dir)
+            self._orphans[os.path.normpath(output_dir)] = size
+            self._disk += size
+            self._evict()
+
+    def claim(self, output_dir):
+        """Stop tracking an unowned directory because a job is about to write into it."""
+        if output_dir:
+            with self._lock:
+                self._release(output_dir)
+
+    def _release(self, output_dir):
+        size = self._orphans.pop(os.path.normpath(output_dir), None)
+        if size is not None:
+            self._disk -= size
+
+    def _oldest_orphan(self):
+        cutoff = time.time() - self.orphan_grace
+        candidates = []
+        for path in self._orphans:
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                mtime = 0.0
+            if mtime <= cutoff:
+                candidates.append((mtime, path))
+        return min(candidates)[1] if candidates else None
+
+    def _evict(self, keep=None):
+        # Unowned directories go first, then least recently used entries
+        while self._disk > self.max_disk:
+            orphan = self._oldest_orphan()
+            if orphan is None:
+                break
+            self._release(orphan)
+            shutil.rmtree(orphan, ignore_errors=True)
+        while self._entries and (self._memory > self.max_memory or self._disk > self.max_disk):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                # A result larger than the budgets on its own stays on disk, unowned
+                output_dir = self._entries[oldest]["output_dir"]
+                self._drop(oldest, remove_files=False)
+                size = directory_size(output_dir)
+                self._orphans[os.path.normpath(output_dir)] = size
+                self._disk += size
+                break
+            self._drop(oldest, remove_files=True)
+
+    def _drop(self, key, remove_files):
+        entry = self._entries.pop(key)
+        self._memory -= entry["memory"]
+        self._disk -= entry["disk"]
+        if remove_files:
+            shutil.rmtree(entry["output_dir"], ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._memory,
+                "disk_bytes": self._disk,
+                "unowned_dirs": len(self._orphans),
+                "max_memory_bytes": self.max_memory,
+                "max_disk_bytes": self.max_disk,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+class JobManager:
+    """
+    Bounded process pool plus a job table (id -> state).
+
+    States: queued -> running -> succeeded | failed. A job is running once a worker
+    has actually started it (reported through a queue), not when it is handed to
+    the pool, whose call queue holds jobs ahead of the free workers. At most
+    max_pending jobs may be unfinished at once; finished jobs are forgotten after
+    ttl seconds.
+
+    Each job writes into its own output_dir. Submissions that share a content key
+    while an earlier one is still unfinished are attached to that job, so two
+    identical analyses never write the same directory at the same time.
+
+    With a ResultCache, a submission whose key is cached becomes an already
+    finished job (cache "hit") and no worker is used; other jobs are "miss".
+
+    Every worker holds up to dataset_cache_bytes of parsed datasets for
+    dataset_cache_ttl seconds (0 disables it); jobs opt in with dataset_key.
+
+    With a progress_dir, each job that runs in a worker streams its progress
+    events to <progress_dir>/<job_id>.jsonl (see read_progress); the file is
+    removed when the job expires. Cache hits have no progress file.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, ttl=3600, cache=None,
+                 dataset_cache_bytes=0, dataset_cache_ttl=1800, progress_dir=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.cache = cache
+        self.dataset_cache_bytes = dataset_cache_bytes
+        self.dataset_cache_ttl = dataset_cache_ttl
+        self.progress_dir = progress_dir
+        if progress_dir:
+            os.makedirs(progress_dir, exist_ok=True)
+        self._executor = None
+        self._started = None
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created lazily so importing app.py (e.g. in tests or tooling) starts no processes
+        if self._executor is None:
+            self._started = multiprocessing.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.dataset_cache_bytes, self.dataset_cache_ttl, self._started),
+            )
+        return self._executor
+
+    def _collect_started(self):
+        # Record the start times the workers reported since the last call
+        if self._started is None:
+            return
+        while True:
+            try:
+                job_id, started_at = self._started.get_nowait()
+            except queue.Empty:
+                break
+            job = self._jobs.get(job_id)
+            if job is not None and job["started_at"] is None:
+                job["started_at"] = started_at
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and now - job["finished_at"] > self.ttl]
+        for job_id in expired:
+            path = self._jobs.pop(job_id)["progress_path"]
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def submit(self, key=None, **analysis_kwargs):
+        """
+        Queue an analysis and return its job id; raises JobQueueFull when saturated.
+        key is the analysis' content address (see analysis_key).
+        """
+        with self._lock:
+            self._purge_expired()
+            if key is not None and key in self._inflight:
+                return self._inflight[key]
+            cached = self.cache.get(key) if self.cache is not None and key is not None else None
+            pending = sum(1 for job in self._jobs.values() if job["finished_at"] is None)
+            if cached is None and pending >= self.max_pending:
+                raise JobQueueFull(f"Too many pending analyses ({pending}); please retry later")
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "key": key,
+                "output_dir": analysis_kwargs.get("output_dir"),
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "future": None,
+                "result": None,
+                "error": None,
+                "cache": "miss",
+                "progress_path": None,
+            }
+            self._jobs[job_id] = job
+            if cached is not None:
+                job["future"] = Future()
+                job["future"].set_result(cached)
+                job.update(result=cached, started_at=job["submitted_at"],
+                           finished_at=job["submitted_at"], cache="hit")
+                return job_id
+            if key is not None:
+                self._inflight[key] = job_id
+            if self.cache is not None:
+                self.cache.claim(job["output_dir"])
+            if self.progress_dir:
+                job["progress_path"] = os.path.join(self.progress_dir, f"{job_id}.jsonl")
+            job["future"] = self._pool().submit(run_analysis_job, progress_path=job["progress_path"],
+                                                job_id=job_id, **analysis_kwargs)
+        job["future"].add_done_callback(lambda fut, job=job: self._finish(job, fut))
+        return job_id
+
+    def _finish(self, job, future):
+        try:
+            job["result"] = future.result()
+        except Exception as e:  # worker crashed or the pool was broken
+            job["error"] = f"Analysis worker failed: {e}"
+        if self.cache is not None:
+            result = job["result"]
+            if job["key"] is not None and result is not None and result.get("status") == "success":
+                self.cache.put(job["key"], result)
+            else:
+                # Failed runs are not cached, but their output directory still takes disk space
+                self.cache.track(job["output_dir"])
+        job["finished_at"] = time.time()
+        with self._lock:
+            if self._inflight.get(job["key"]) == job["job_id"]:
+                del self._inflight[job["key"]]
+
+    def status(self, job_id):
+        """Public view of a job (no future), or None if unknown/expired."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        self._collect_started()
+        if job["finished_at"] is None:
+            state = "running" if job["started_at"] is not None else "queued"
+        elif job["error"] is not None or job["result"]["status"] != "success":
+            state = "failed"
+        else:
+            state = "succeeded"
+        view = {
+            "job_id": job_id,
+            "status": state,
+            "output_dir": job["output_dir"],
+            "cache": job["cache"],
+            "submitted_at": job["submitted_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+        if job["error"] is not None:
+            view["error"] = job["error"]
+        if job["result"] is not None:
+            view["result"] = job["result"]
+        return view
+
+    def output_dir(self, job_id):
+        """Output directory of a known job, or None."""
+        job = self._jobs.get(job_id)
+        return job["output_dir"] if job is not None else None
+
+    def progress_path(self, job_id):
+        """Progress file of a known job, or None (unknown job, cache hit or no progress_dir)."""
+        job = self._jobs.get(job_id)
+        return job["progress_path"] if job is not None else None
+
+    def cache_state(self, job_id):
+        """"hit" or "miss" for a known job, or None."""
+        job = self._jobs.get(job_id)
+        return job["cache"] if job is not None else None
+
+    async def wait(self, job_id):
+        """Await a job without blocking the event loop and return its result dict."""
+        job = self._jobs[job_id]
+        await asyncio.wrap_future(job["future"])
+        return job["future"].result()
@@ -0,0 +1,216 @@
+"""
+Content-addressable store for uploaded DOE datasets
+
+/runDOE used to save uploads as ./input/<basename>, so two users uploading
+"data.csv" overwrote each other and the same file was stored once per upload.
+DatasetStore writes the upload in fixed-size chunks while hashing it, and files
+it under its SHA-256 digest: identical uploads share one file, and the digest is
+the dataset id that the analysis endpoints accept in place of a file path.
+
+Large files can also arrive as a resumable upload: start_upload() opens a
+session, append_upload() adds chunks at an explicit offset (a client that lost
+its connection asks upload_state() where to continue), and finalize_upload()
+moves the assembled file into the store. Sessions live on disk, so an upload
+survives a server restart; abandoned ones are purged after upload_ttl seconds.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+CHUNK_SIZE = 1 << 20
+
+_DATASET_ID = re.compile(r"^[0-9a-f]{64}$")
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadOffsetMismatch(Exception):
+    """A chunk was sent for an offset other than the session's current size."""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadIncomplete(Exception):
+    """finalize_upload() was called before total_bytes had been received."""
+
+
+class DatasetWriter:
+    """
+    Incremental writer for one upload: write() chunks as they arrive, then
+    commit() to file them under their digest (or abort() to discard them).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.size = 0
+        self._digest = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.tmp_dir, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self._digest.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """Return (dataset_id, deduplicated)."""
+        self._file.close()
+        dataset_id = self._digest.hexdigest()
+        path = self.store.path_for(dataset_id)
+        if os.path.exists(path):
+            os.remove(self._tmp_path)
+            return dataset_id, True
+        os.replace(self._tmp_path, path)
+        return dataset_id, False
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+class DatasetStore:
+    """Uploaded CSV files kept as <root>/<sha256>.csv."""
+
+    def __init__(self, root="./input/datasets", upload_ttl=24 * 3600):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.uploads_dir = os.path.join(root, "uploads")
+        self.upload_ttl = upload_ttl
+        self._lock = threading.Lock()
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+
+    def path_for(self, dataset_id):
+        return os.path.join(self.root, f"{dataset_id}.csv")
+
+    def writer(self):
+        return DatasetWriter(self)
+
+    def save_fileobj(self, fileobj, chunk_size=CHUNK_SIZE):
+        """Copy a binary file object into the store; returns (dataset_id, size, deduplicated)."""
+        writer = self.writer()
+        try:
+            for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+                writer.write(chunk)
+            dataset_id, deduplicated = writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        return dataset_id, writer.size, deduplicated
+
+    def path(self, dataset_id):
+        """Path of a stored dataset, or None for malformed or unknown ids."""
+        if not isinstance(dataset_id, str) or not _DATASET_ID.match(dataset_id):
+            return None
+        path = self.path_for(dataset_id)
+        return path if os.path.isfile(path) else None
+
+    # --- resumable uploads ---
+
+    def _upload_paths(self, upload_id):
+        base = os.path.join(self.uploads_dir, upload_id)
+        return base + ".part", base + ".json"
+
+    def _upload_meta(self, upload_id):
+        if not isinstance(upload_id, str) or not _UPLOAD_ID.match(upload_id):
+            return None
+        part_path, meta_path = self._upload_paths(upload_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        meta["offset"] = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        return meta
+
+    def _purge_uploads(self):
+        # A session is abandoned when its data file has not grown for upload_ttl seconds
+        cutoff = time.time() - self.upload_ttl
+        for name in os.listdir(self.uploads_dir):
+            if not name.endswith(".json"):
+                continue
+            part_path, meta_path = self._upload_paths(name[:-len(".json")])
+            try:
+                last_write = os.path.getmtime(part_path if os.path.exists(part_path) else meta_path)
+                if last_write < cutoff:
+                    for path in (part_path, meta_path):
+                        if os.path.exists(path):
+                            os.remove(path)
+            except OSError:
+                pass
+
+    def start_upload(self, filename=None, total_bytes=None):
+        """Open a resumable upload session and return its state (upload_id, offset 0, ...)."""
+        with self._lock:
+            self._purge_uploads()
+            upload_id = uuid.uuid4().hex
+            part_path, meta_path = self._upload_paths(upload_id)
+            open(part_path, "wb").close()
+            meta = {"upload_id": upload_id, "filename": filename, "total_bytes": total_bytes,
+                    "created_at": time.time()}
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        return {**meta, "offset": 0}
+
+    def upload_state(self, upload_id):
+        """Session state including the current offset, or None for unknown ids."""
+        return self._upload_meta(upload_id)
+
+    def append_upload(self, upload_id, offset, data):
+        """
+        Append one chunk at offset and return the new offset. Raises KeyError for
+        unknown sessions, UploadOffsetMismatch if offset is not the current size
+        and ValueError if the chunk would exceed the announced total_bytes.
+        """
+        with self._lock:
+            meta = self._upload_meta(upload_id)
+            if meta is None:
+                raise KeyError(upload_id)
+            if offset != meta["offset"]:
+                raise UploadOffsetMismatch(meta["offset"])
+            total = meta["total_bytes"]
+            if total is not None and offset + len(data) > total:
+                raise ValueError(f"Chunk exceeds the announced size of {total} bytes")
+            part_path, _ = self._upload_paths(upload_id)
+            with open(part_path, "ab") as f:
+                f.write(data)
+            return offset + len(data)
+
+    def finalize_upload(self, upload_id):
+        """
+        Move a complete upload into the store; returns (dataset_id, size, deduplicated).
+        Raises KeyError for unknown sessions and UploadIncomplete if bytes are missing.
+        """
+        with self._lock:
+            meta = self._upload_meta(upload_id)
+            if meta is None:
+                raise KeyError(upload_id)
+            if meta["total_bytes"] is not None and meta["offset"] != meta["total_bytes"]:
+                raise UploadIncomplete(f"Received {meta['offset']} of {meta['total_bytes']} bytes")
+            # Detach the data from the session so hashing runs outside the lock
+            part_path, meta_path = self._upload_paths(upload_id)
+            final_path = os.path.join(self.tmp_dir, f"{upload_id}.final")
+            os.replace(part_path, final_path)
+            os.remove(meta_path)
+        digest = hashlib.sha256()
+        with open(final_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        dataset_id = digest.hexdigest()
+        path = self.path_for(dataset_id)
+        deduplicated = os.path.exists(path)
+        if deduplicated:
+            os.remove(final_path)
+        else:
+            os.replace(final_path, path)
+        return dataset_id, meta["offset"], deduplicated